@@ -1,33 +1,78 @@
 
 
+import os
+import sys
+import numpy as np
 import pandas as pd
-import openpyxl
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))      # the helpers shared by every analyzer are one folder up
+from analyzer_tools import export_frames
+
+SCORES_FILE = None           # a long format csv (Class, Student, Subject, Score) of every class, None uses the sample class below
+PASS_MARK = 40               # average needed to pass
+KEYS = ["Class","Student"]
+
 data = {"name":["Ram","Hari","Shyam","Bhola","Bimal","Rajni","David"],
         "Math":[50,60,40,80,60,55,37],
         "Science":[20,65,18,20,17,95,66],
         "English":[70,70,28,30,18,50,46]
-        
+
         }
 
 
-df = pd.DataFrame(data)
-df["Average"] = df.select_dtypes(include="number").mean(axis=1)
 
-df["Result"] = df["Average"].apply(lambda x : "Pass" if x>40 else "Fail")
+'''The sample class in the long format, one row per student per subject'''
+def sample_scores():
+    df = pd.DataFrame(data)
+    scores = df.melt(id_vars="name",var_name="Subject",value_name="Score").rename(columns={"name": "Student"})
+    scores.insert(0,"Class","Sample")
+    return scores
+
+
+'''Loading the scores of every class, the repeated names are read as categories'''
+def load_scores(file_name):
+    return pd.read_csv(file_name,dtype={"Class": "category","Student": "category","Subject": "category"})
+
+
+'''Averages, results and ranks of every student of every class in one grouped pass'''
+def grade_report(scores,pass_mark=PASS_MARK):
+    repeated = scores.duplicated(KEYS + ["Subject"],keep=False)
+    if repeated.any():          # first() below would keep one of the scores and drop the others without a word
+        shown = scores.loc[repeated,KEYS + ["Subject"]].drop_duplicates().head(5).to_string(index=False)
+        raise ValueError(f"{int(repeated.sum())} scores are given more than once for the same student and subject:\n{shown}")
+
+    report = scores.groupby(KEYS + ["Subject"],observed=True,sort=False)["Score"].first().unstack("Subject")      # one row per student, one column per subject, the scores keep their type
+    report.columns = report.columns.astype(str)
+    report.columns.name = None
+
+    report["Average"] = report.mean(axis=1)          # NaN for a student without any score, who then fails
+    report["Result"] = pd.Categorical(np.where(report["Average"].to_numpy() >= pass_mark,"Pass","Fail"),categories=["Pass","Fail"])
+    report["Rank"] = report.groupby(level="Class",observed=True,sort=False)["Average"].rank(method="min",ascending=False,na_option="bottom").astype(int)
+
+    report = report.reset_index().sort_values(["Class","Rank"],kind="stable",ignore_index=True)
+    passed = report["Result"] == "Pass"
+    return report,report[passed],report[~passed]
+
+
+
+def main():
+    scores = load_scores(SCORES_FILE) if SCORES_FILE else sample_scores()
+    df,passed_students,failed_students = grade_report(scores)
+
+    print("The original dataframe is given below: ")
+    print(df)
+
 
-df.sort_values(by="Average",ascending=False,inplace=True)
-print("The original dataframe is given below: ")
-print(df)
+    print("The passed students are : ")
+    print(passed_students)
+    # passed_students.to_csv("Passed.csv",index=False)
+    export_frames("passed.xlsx",{"passed": passed_students},index=True)
 
+    print("The students who failed are: ")
+    print(failed_students)
+    export_frames("Failed.xlsx",{"failed": failed_students},index=True)
 
-print("The passed students are : ")
 
-passed_students = df[df["Average"]>=40]
-print(passed_students)
-# passed_students.to_csv("Passed.csv",index=False)
-passed_students.to_excel("passed.xlsx")
 
-print("The students who failed are: ")
-failed_students = df[df["Average"]<40]
-print(failed_students)
-failed_students.to_excel("Failed.xlsx")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,158 @@
 
 
+import os
+import sys
+import json
+import io
+import time
+import heapq
+import hashlib
 import pandas as pd
-import openpyxl
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))      # the helpers shared by every analyzer are one folder up
+from analyzer_tools import export_frames
 
 file_name = "weather_data.csv"
-df = pd.read_csv(file_name)
-print("This is just the raw data")
-# print(df)
-df["Average_temp"] = df[['High Temp (°C)', 'Low Temp (°C)']].mean(axis=1)
-df.sort_values(by="Average_temp",inplace=True,ascending=False)
-cols = list(df.columns)
-cols[3],cols[4] = cols[4],cols[3]
-new_df = df[cols]
-print(new_df)
-print("The hottest days are: ")
-hot_df = new_df[["Date","Average_temp"]].head()
-print(hot_df)
+TOP_K = 5                    # number of hottest days kept
+SHOW_FULL_RANKING = True     # printing every day sorted by temperature needs a full sort, turn it off for long histories
+INCREMENTAL = False          # keep a state between runs and read only the rows appended to the file since the last one
+STATE_FILE = ".weather_state.json"
+ROLLING_DAYS = 7             # days in the rolling window of every station
+PERIOD = "M"                 # period of the per station summary, "M" months or "Y" years
+STATION_COL = "Station"      # files without it are treated as a single station
+SETTLE_SECONDS = 5           # an unfinished last line counts as a row once the file wasn't written to for this long
+HEAD_BYTES = 65_536          # start of the file hashed to notice it was rewritten and not just appended to
+TEMP_COLS = ['High Temp (°C)', 'Low Temp (°C)']
+
+
+
+'''Hash of the start of the file, it changes when the file is rewritten instead of appended to'''
+def head_hash(file_name,size):
+    with open(file_name,"rb") as source:
+        return hashlib.sha1(source.read(min(size,HEAD_BYTES))).hexdigest()
+
+
+'''The state of the last run, or a fresh one when there is none or the file was truncated or rewritten since'''
+def load_state(file_name):
+    try:
+        with open(STATE_FILE) as saved:
+            state = json.load(saved)
+        if os.path.getsize(file_name) >= state["offset"] and head_hash(file_name,state["offset"]) == state["head"]:
+            return state
+        print("The file was rewritten, rebuilding the state from the start")
+
+    except (OSError,ValueError,KeyError):
+        pass
+
+    return {"offset": 0,"rows": 0,"head": None,"columns": None,"heap": [],"windows": [],"periods": []}
+
+
+'''Saving the state next to the data, through a temporary file so a crash never leaves half of it'''
+def save_state(state,file_name):
+    state["head"] = head_hash(file_name,state["offset"])
+    temporary = f"{STATE_FILE}.{os.getpid()}.tmp"
+    with open(temporary,"w") as saved:
+        json.dump(state,saved)
+    os.replace(temporary,STATE_FILE)
+
+
+'''Reading only the complete rows written after the offset of the last run. The last line counts even without a line
+break once the file is settled: it has the size it had at the last run, or wasn't written to for SETTLE_SECONDS'''
+def read_appended(file_name,state):
+    with open(file_name,"rb") as source:
+        source.seek(state["offset"])
+        new_bytes = source.read()
+
+    size = state["offset"] + len(new_bytes)
+    settled = state.get("size") == size or time.time() - os.path.getmtime(file_name) > SETTLE_SECONDS
+    end = len(new_bytes) if settled else new_bytes.rfind(b"\n") + 1           # a row still being written is left for the next run
+    state["size"] = size
+    if end == 0:
+        return None
+
+    header = "infer" if state["columns"] is None else None
+    new = pd.read_csv(io.BytesIO(new_bytes[:end]),header=header,names=state["columns"])
+    state["columns"] = list(new.columns)
+    state["offset"] += end
+    return new
+
+
+'''Merging the new rows into the state: top K heap, rolling window and per period stats of every station'''
+def update_state(state,new):
+    new["Average_temp"] = new[TEMP_COLS].mean(axis=1)
+    new.index = pd.RangeIndex(state["rows"],state["rows"] + len(new))      # row numbers of the whole file, like a full read gives
+    state["rows"] += len(new)
+    station = new[STATION_COL] if STATION_COL in new.columns else pd.Series("All",index=new.index)
+
+    heap = [tuple(item) for item in state["heap"]]
+    for row,(date,average) in new.nlargest(TOP_K,"Average_temp")[["Date","Average_temp"]].iterrows():
+        item = (float(average),-int(row),date)            # on equal temperatures the earlier day stays, like nlargest does
+        if len(heap) < TOP_K:
+            heapq.heappush(heap,item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap,item)
+    state["heap"] = heap
+
+    days = pd.DataFrame({"Station": station,"Date": new["Date"],"Average_temp": new["Average_temp"],
+                         "High": new[TEMP_COLS[0]],"Low": new[TEMP_COLS[1]]})
+    windows = pd.concat([pd.DataFrame(state["windows"],columns=days.columns),days],ignore_index=True) if state["windows"] else days
+    state["windows"] = windows.groupby("Station",sort=False).tail(ROLLING_DAYS).values.tolist()      # only the last days of every station are kept
+
+    days["Period"] = pd.to_datetime(days["Date"]).dt.to_period(PERIOD).astype(str)
+    periods = days.groupby(["Station","Period"],sort=False)["Average_temp"].agg(["count","sum","min","max"]).reset_index()
+    if state["periods"]:
+        periods = pd.concat([pd.DataFrame(state["periods"],columns=periods.columns),periods],ignore_index=True)
+    state["periods"] = periods.groupby(["Station","Period"],sort=False).agg({"count": "sum","sum": "sum","min": "min","max": "max"}).reset_index().values.tolist()
+    return state
+
+
+'''The incremental run: O(new rows) work on top of the saved state, returns the hottest days'''
+def incremental_analysis(file_name):
+    state = load_state(file_name)
+    new = read_appended(file_name,state)
+    print(f"Read {0 if new is None else len(new)} new rows, {state['rows'] + (0 if new is None else len(new))} in total")
+    if new is not None and len(new):
+        update_state(state,new)
+    save_state(state,file_name)
+
+    windows = pd.DataFrame(state["windows"],columns=["Station","Date","Average_temp","High","Low"])
+    rolling = windows.groupby("Station",sort=False).agg(mean_temp=("Average_temp","mean"),min_temp=("Low","min"),max_temp=("High","max"),last_day=("Date","last"))
+    print(f"\nThe last {ROLLING_DAYS} days of every station: ")
+    print(rolling)
+
+    periods = pd.DataFrame(state["periods"],columns=["Station","Period","count","sum","min","max"])
+    periods["mean"] = periods["sum"] / periods["count"]
+    print("\nThe average temperature of every station by period: ")
+    print(periods.drop(columns="sum").set_index(["Station","Period"]))
+
+    hottest = sorted(state["heap"],reverse=True)
+    return pd.DataFrame({"Date": [item[2] for item in hottest],"Average_temp": [item[0] for item in hottest]},index=[-item[1] for item in hottest])
+
+
+
+if INCREMENTAL:
+    hot_df = incremental_analysis(file_name)
+    print("The hottest days are: ")
+    print(hot_df)
+
+else:
+    df = pd.read_csv(file_name)
+    print("This is just the raw data")
+    # print(df)
+    df["Average_temp"] = df[TEMP_COLS].mean(axis=1)
+    cols = list(df.columns)
+    cols[3],cols[4] = cols[4],cols[3]
+    new_df = df[cols]
+    if SHOW_FULL_RANKING:
+        print(new_df.sort_values(by="Average_temp",ascending=False))
+    print("The hottest days are: ")
+    hot_df = new_df.nlargest(TOP_K,"Average_temp")[["Date","Average_temp"]]     # partial selection, no need to sort all the days for the top few
+    print(hot_df)
 
 # with open("hottest.csv",'w') as hot:
 #     hot.write("TOP 5 HOTTEST DAYS THIS MONTH\n")
 #     hot_df.to_csv(hot, index=False)
 
-
-with pd.ExcelWriter('hottest.xlsx',engine="openpyxl") as writer:
-    workbook = writer.book
-    sheet_name = "sheet1"
-    hot_df.to_excel(writer,index=False,startrow=1,sheet_name=sheet_name)
-    worksheet = writer.sheets[sheet_name]
-    worksheet.cell(row=1,column=1,value="TOP 5 HOTTEST DAYS THIS MONTH")
+export_frames("hottest.xlsx",{"sheet1": hot_df},titles={"sheet1": f"TOP {TOP_K} HOTTEST DAYS THIS MONTH"})
 
 
@@ -2,9 +2,23 @@
 '''SALES DATA ANALYZER'''
 
 
-import warnings
+import os
+import io
+import sys
+import json
+import time
+import hashlib
+from glob import glob
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
 import pandas as pd
-from rapidfuzz import process
+from rapidfuzz import process, fuzz
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))      # the helpers shared by every analyzer are one folder up
+from analyzer_tools import (CATEGORY_MAX_RATIO, traced, show_trace, file_signature, content_hash, cache_paths, date_plan,
+                            is_low_cardinality, clean_categories, downcast_numbers, top_k, multi_aggregate, run_sections, export_frames)
 
 FILE_NAME = "mini_sales_data.csv"
 
@@ -14,39 +28,163 @@ INTEGER_COLS = ["Order_Quantity","Unit_Cost","Unit_Price","Profit","Cost","Reven
 
 FUZZ_THRESHOLD = 80
 
+SCHEMA_TARGETS = ["Date","Customer_Age"] + STRING_COLS + INTEGER_COLS       # every column name any of the analysis looks for
+
+
+
+CACHE_DIR = ".clean_cache"     # cleaned copies of the source files, set to None to always clean from scratch
+
+CLEANING_VERSION = 3         # bump it whenever the cleaning steps change, so the old cached copies aren't used anymore
+
+TOP_K = None                 # how many rows each report shows, None for the full ordering
+
+CHUNK_SIZE = None          # set a row count (e.g. 500_000) to analyze big files chunk by chunk instead of all at once
+
+DOWNCAST = True            # keep the number columns in the smallest integer type that holds every value exactly
+
+MEMORY_REPORT = False      # print the memory of every number column before and after downcasting
+
+PARSER_ENGINE = "pyarrow"  # parser of the projected whole file reads, "c" works too when pyarrow isn't installed
+
+BATCH_SOURCE = None        # a directory or a glob like "sales/*.csv" to analyze many files together instead of FILE_NAME
+
+BATCH_WORKERS = None       # processes of the batch runner, None uses every core
+
+REPORT_WORKERS = None      # workers running the report sections side by side, None uses every core, 1 runs them one after another
+
+REPORT_POOL = "thread"     # "thread" shares the frame as it is, "process" forks workers that inherit it (threads where fork isn't available)
+
+INCREMENTAL = False        # keep the merged aggregates of FILE_NAME between runs and only aggregate the rows appended since the last one
+
+STATE_DIR = ".sales_state"     # where the incremental aggregates and the position in the file are kept
+
+REFRESH_CHUNK = 500_000    # rows cleaned and aggregated at a time by the incremental refresh
+
+CHECK_BYTES = 1 << 20      # bytes hashed at the start of the file and just before the offset to notice a rewrite
+
+SETTLE_SECONDS = 5         # an unfinished last line counts as a row once the file wasn't written to for this long
+
+EXPORT_FILE = None         # e.g. "sales_reports.xlsx" to also write every report to a workbook, one sheet each
+
+
+
 '''Load the datas'''
 def load_data(file_name):
     try:
-        df = pd.read_csv(file_name)
-        return df
+        usecols,types = read_plan(tuple(pd.read_csv(file_name,nrows=0).columns))       # only the header is read to plan the real read
+        try:
+            return pd.read_csv(file_name,usecols=usecols,dtype=types,engine=PARSER_ENGINE)
+
+        except (ValueError,TypeError):        # a number column with gaps or text in it, read it untyped and let enforce_data_type coerce it
+            return pd.read_csv(file_name,usecols=usecols,dtype=text_types(types),engine=PARSER_ENGINE)
     
     except FileNotFoundError as e:
         print(f"AN ERROR OCCURED: {e}")
 
 
+'''The columns the analysis needs out of a header and the types they are read with, strings straight as categories'''
+def read_plan(header):
+    schema = resolve_schema(header)
+    if not schema:
+        return None,None         # nothing recognised, read everything and let the analysis report the missing columns
 
-'''Conversion of date to datetime objects'''
-def to_date_time(df):
+    types = {schema[col]: "category" for col in STRING_COLS if col in schema}
+    types.update({schema[col]: "int64" for col in INTEGER_COLS + ["Customer_Age"] if col in schema})
+    if "Date" in schema:
+        types[schema["Date"]] = "string"       # kept as text for to_date_time, str would read the gaps as "None" under pyarrow
+    return list(dict.fromkeys(schema.values())),types
+
+
+'''The read types without the numbers, for reads where a number column can't be trusted to parse'''
+def text_types(types):
+    return {col: kind for col,kind in types.items() if kind != "int64"} if types else None
+
+
+'''Load the datas chunk by chunk, so that only one chunk stays in the memory at a time'''
+def load_data_in_chunks(file_name,chunk_size):
+    try:
+        usecols,types = read_plan(tuple(pd.read_csv(file_name,nrows=0).columns))
+        return pd.read_csv(file_name,usecols=usecols,dtype=text_types(types),chunksize=chunk_size)
+
+    except FileNotFoundError as e:
+        print(f"AN ERROR OCCURED: {e}")
+
+
+
+'''Loading the cleaned data from the cache, None if the source file or the cleaning changed since it was cached'''
+def read_clean_cache(file_name,memory_map=False):
+    data_path,manifest_path = cache_paths(file_name,CACHE_DIR)
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
 
-    with warnings.catch_warnings():
+        if manifest["version"] != CLEANING_VERSION or manifest.get("downcast") != DOWNCAST:       # the cached types follow the cleaning options
+            return None
 
-        for col in df.select_dtypes(include="object").columns:
-            try:
-                warnings.simplefilter(action="ignore",category=UserWarning)   #Suppressing the User warning  that is being shown everytime the columns can't be converted as the datatype object
-                df[col] = pd.to_datetime(df[col])
+        if manifest["signature"] != file_signature(file_name):       # size or mtime changed, only the content hash can tell if the data did
+            if manifest["hash"] != content_hash(file_name):
+                return None
 
-            except Exception:
-                pass
+            manifest["signature"] = file_signature(file_name)          # same data, only touched: remember the new signature so it isn't hashed again
+            with open(manifest_path,"w") as manifest_file:
+                json.dump(manifest,manifest_file,indent=2)
 
-    print("Conversion successful")
+        df = pd.read_parquet(data_path,memory_map=memory_map)
+        for col in df.select_dtypes(include="category").columns:
+            if df[col].cat.categories.dtype == object:
+                df[col] = df[col].cat.rename_categories(df[col].cat.categories.astype("string"))     # parquet gives the categories back as object
+
+        return df
+
+    except (FileNotFoundError,KeyError,json.JSONDecodeError):
+        return None
+
+    except Exception as e:
+        print(f"AN ERROR OCCURED while reading the cache: {e}")
+        return None
+
+
+'''Saving the cleaned data in a columnar file next to a manifest describing the source it came from'''
+def write_clean_cache(file_name,df):
+    data_path,manifest_path = cache_paths(file_name,CACHE_DIR)
+    try:
+        os.makedirs(CACHE_DIR,exist_ok=True)
+        df.to_parquet(data_path,index=False)
+        with open(manifest_path,"w") as manifest_file:
+            json.dump({"source": os.path.abspath(file_name),"signature": file_signature(file_name),
+                       "hash": content_hash(file_name),"version": CLEANING_VERSION,"downcast": DOWNCAST},manifest_file,indent=2)
+
+    except Exception as e:
+        print(f"AN ERROR OCCURED while writing the cache: {e}")
+
+
+'''Conversion of date to datetime objects'''
+def to_date_time(df,verbose=True,file_name=None):
+
+    for col,fmt in date_plan(df,file_name).items():       # only the columns that really are dates get parsed, with their exact format
+        try:
+            df[col] = pd.to_datetime(df[col],format=fmt,errors="coerce")      # the few cells the format doesn't fit become NaT
+
+        except Exception:
+            pass
+
+    if verbose:
+        print("Conversion successful")
     return df
     
 
 
+
 '''making all the string values clean and uniform'''
-def uniform_string_values(df):
-    for col in df.select_dtypes(include="object").columns:
+def uniform_string_values(df,categorical=True):
+    for col in df.select_dtypes(include=["object","string","category"]).columns:
         try: 
+            if categorical and is_low_cardinality(df[col]):
+                as_category = df[col].astype("category")
+                if len(as_category.cat.categories) <= CATEGORY_MAX_RATIO * len(as_category):      # the sample can lie, so check again on the whole column
+                    df[col] = clean_categories(as_category)
+                    continue
+
             df[col] = df[col].str.strip().str.title()
  
             
@@ -58,11 +196,37 @@ def uniform_string_values(df):
 
 '''Enforcing the column datas'''
 def enforce_data_type(df,string_cols,numeric_cols):
+    string_cols = [col for col in string_cols if not isinstance(df[col].dtype,pd.CategoricalDtype)]     # category columns already have string categories
     df[string_cols] = df[string_cols].astype("string")
     df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric,errors ="coerce")
     return df
 
 
+
+'''Loading the cleaned data, straight from the cache when the source file didn't change'''
+def load_clean_data(file_name,memory_map=False):
+    if CACHE_DIR:
+        df = traced("load_cache",read_clean_cache,file_name,memory_map)
+        if df is not None:
+            return df
+
+    df = traced("load",load_data,file_name)
+    if df is None:
+        return None
+
+    traced("datetime",to_date_time,df,file_name=file_name)
+    print("Now the uniform string values")
+    traced("strings",uniform_string_values,df)
+    traced("types",enforce_data_type,df,STRING_COLS,INTEGER_COLS)
+    if DOWNCAST:
+        traced("downcast",downcast_numbers,df,INTEGER_COLS + ["Customer_Age"],verbose=MEMORY_REPORT)
+
+    if CACHE_DIR:
+        write_clean_cache(file_name,df)
+
+    return df
+
+
 '''Get user's Preference'''
 def user_preference():
     user_input = input("==Do you want the analysis for all the data(A) of for the data of specific time range(T)?==").upper()
@@ -78,7 +242,6 @@ def user_preference():
 
 
 
-
 '''Insights based on particular time frame'''
 def insights_within_time_constraints(df,start,end):
     try: 
@@ -90,17 +253,40 @@ def insights_within_time_constraints(df,start,end):
 
 
 
-'''A reuseable function for matching the columns values'''
-def fuzzy_matcher(df,targets,threshold):
+'''Resolving all the target column names at once with a single score matrix, cached on the column names so the same header is only scored once'''
+@lru_cache(maxsize=64)
+def resolve_schema(columns,targets=tuple(SCHEMA_TARGETS),threshold=FUZZ_THRESHOLD):
     try:
+        scores = process.cdist(targets,columns,scorer=fuzz.WRatio)     # WRatio is what extractOne uses by default
+        best = scores.argmax(axis=1)
+
         matched = {}
-        for target in targets:
-            match,score,_ = process.extractOne(target,df.columns)
+        for row,target in enumerate(targets):
+            if scores[row,best[row]] >= threshold:
+                matched[target] = columns[best[row]]
+
+        return MappingProxyType(matched)      # read only, since the same object is shared by every caller
+
+    except Exception as e:
+        print(f"AN ERROR OCCURED: {e}")
+        return MappingProxyType({})
+
+
+'''The resolved schema of a dataframe'''
+def schema_of(df):
+    return resolve_schema(tuple(df.columns))
+
 
-            if score >= threshold:
-                matched[target] = match
 
-        return matched if len(matched) == len(targets) else None
+'''A reuseable function for matching the columns values'''
+def fuzzy_matcher(df,targets,threshold,schema=None):
+    try:
+        if schema is None:
+            schema = resolve_schema(tuple(df.columns),tuple(targets),threshold)
+
+        matched = {target: schema[target] for target in targets if target in schema}
+
+        return matched if len(matched) == len(set(targets)) else None
 
   
 
@@ -110,35 +296,29 @@ def fuzzy_matcher(df,targets,threshold):
 
 
 
-
-
 '''Evaluating total of all the financial transactions'''
-def totals(df,int_col):
+def totals(df,int_col,schema=None):
     try:
-        for col in int_col:
-            match,score,_ = process.extractOne(col,df.columns)
-            if score >= 80:
-                result = {df[col].sum().item() for col in int_col}         # .item() is a numpy method that converts
+        match = fuzzy_matcher(df,int_col,FUZZ_THRESHOLD,schema)
+        if match:
+            result = {df[match[col]].sum().item() for col in int_col}         # .item() is a numpy method that converts
                                                                          # np.int() item to regular int, if not done so the
                                                                          # output will be shown like np.int(total_value). we can also use int() method to convert but specifically for numpy .item() is used
-            else:
-                pass
-
-        return result
+            return result
     
     except Exception as e:
         print(f"AN ERROR OCCURED: {e}")
 
 
 
-
 '''insights on profits'''
-def profit(df):
+def profit(df,schema=None,k=None):
     targets = ["Product","Profit"]
-    match = fuzzy_matcher(df,targets,FUZZ_THRESHOLD)
+    match = fuzzy_matcher(df,targets,FUZZ_THRESHOLD,schema)
     if match:
 
-        return df.groupby(match["Product"])[match["Profit"]].sum().sort_values(ascending=False)
+        profits, = multi_aggregate(df,[([match["Product"]],match["Profit"],"sum")])
+        return top_k(profits,k)
     
     else:
         print("Required column not found for profit calculations")
@@ -146,85 +326,313 @@ def profit(df):
 
 
 '''Average order Quantity'''
-def average_order_quantity(df):
+def average_order_quantity(df,schema=None,k=None):
     targets = ["Product","Order_Quantity"]
-    match = fuzzy_matcher(df,targets,FUZZ_THRESHOLD)
+    match = fuzzy_matcher(df,targets,FUZZ_THRESHOLD,schema)
 
     if match:
-        return df.groupby(match["Product"])[match["Order_Quantity"]].mean().sort_values(ascending=False)
+        average_quantity, = multi_aggregate(df,[([match["Product"]],match["Order_Quantity"],"mean")])
+        return top_k(average_quantity,k)
     
     else:
         pass
 
 
+
 '''Geographical insights on sales'''
-def sales_by_region(df):
+def sales_by_region(df,schema=None,k=None):
     targets = ["Country","Product","Order_Quantity"]
-    match = fuzzy_matcher(df,targets,FUZZ_THRESHOLD)
+    match = fuzzy_matcher(df,targets,FUZZ_THRESHOLD,schema)
     if match:
-        sellings_on_each_country =  df.groupby([match["Country"],match["Product"]])[match["Order_Quantity"]].sum().sort_values(ascending=False)
+        sellings_on_each_country,highest_selling_product_by_country = multi_aggregate(df,[
+            ([match["Country"],match["Product"]],match["Order_Quantity"],"sum"),
+            ([match["Product"],match["Country"]],match["Order_Quantity"],"sum"),       # the same groups in the other order, rolled up without a second scan
+        ])
 
-        highest_selling_product_by_country = df.groupby([match["Product"],match["Country"]])[match["Order_Quantity"]].sum().sort_values(ascending=False)
-
-        return sellings_on_each_country,highest_selling_product_by_country
+        return top_k(sellings_on_each_country,k),top_k(highest_selling_product_by_country,k)
 
 
 
 '''sales insights based on personal traits'''
-def sales_by_personal_traits(df):
+def sales_by_personal_traits(df,schema=None,k=None):
     targets = ["Product","Customer_Age","Age_Group","Order_Quantity","Customer_Gender"]
 
-    match = fuzzy_matcher(df,targets,FUZZ_THRESHOLD)
+    match = fuzzy_matcher(df,targets,FUZZ_THRESHOLD,schema)
     if match:
-        highest_buying_group = df.groupby(match["Age_Group"])[match["Order_Quantity"]].sum().sort_values(ascending=False)
+        highest_buying_group,highest_buying_gender,popular_products_by_age = multi_aggregate(df,[
+            ([match["Age_Group"]],match["Order_Quantity"],"sum"),
+            ([match["Product"],match["Customer_Gender"]],match["Order_Quantity"],"sum"),
+            ([match["Product"],match["Age_Group"]],match["Order_Quantity"],"sum"),
+        ])
 
-        highest_buying_gender = df.groupby([match["Product"],match["Customer_Gender"]])[match["Order_Quantity"]].sum().sort_values(ascending=False)
 
-        popular_products_by_age = df.groupby([match["Product"],match["Age_Group"]])[match["Order_Quantity"]].sum().sort_values(ascending=False)
+        return top_k(highest_buying_group,k),top_k(highest_buying_gender,k),top_k(popular_products_by_age,k)
 
 
-        return highest_buying_group,highest_buying_gender,popular_products_by_age
+'''Partial aggregates of one chunk (sums and counts only), they can be merged with the partials of the other chunks'''
+def partial_aggregates(df,int_cols,schema=None):
+    targets = ["Product","Profit","Country","Order_Quantity","Customer_Age","Age_Group","Customer_Gender"] + list(int_cols)
+    match = fuzzy_matcher(df,targets,FUZZ_THRESHOLD,schema)
+    if match:
+        product,quantity = match["Product"],match["Order_Quantity"]
+
+        profits,quantity_sum,quantity_count,country_product,age_group,product_gender,product_age = multi_aggregate(df,[
+            ([product],match["Profit"],"sum"),
+            ([product],quantity,"sum"),
+            ([product],quantity,"count"),        # the mean is only taken at the end, sum/count of every chunk can be added up
+            ([match["Country"],product],quantity,"sum"),
+            ([match["Age_Group"]],quantity,"sum"),
+            ([product,match["Customer_Gender"]],quantity,"sum"),
+            ([product,match["Age_Group"]],quantity,"sum"),
+        ])
+
+        return {
+            "totals" : {col: df[match[col]].sum() for col in int_cols},
+            "profit" : profits,
+            "order_quantity" : pd.DataFrame({"sum": quantity_sum,"count": quantity_count}).rename_axis(columns=quantity),
+            "country_product" : country_product,
+            "age_group" : age_group,
+            "product_gender" : product_gender,
+            "product_age" : product_age,
+        }
 
+    else:
+        print("Required columns not found for the partial aggregates")
+        return None
 
-            
-def main():
-    try: 
-        df = load_data(FILE_NAME)
 
-    except Exception as e: 
+'''Merging two partial aggregates, the result only grows with the number of groups, not with the number of rows'''
+def merge_partials(state,partial):
+    if state is None:
+        return partial
+
+    merged = {"totals": {col: state["totals"][col] + partial["totals"][col] for col in state["totals"]}}
+    for key in state:
+        if key != "totals":
+            combined = pd.concat([state[key],partial[key]])
+            merged[key] = combined.groupby(level=list(range(combined.index.nlevels))).sum()
+
+    return merged
+
+
+'''Turning the merged partials into the same reports as the in-memory analysis'''
+def finalize_aggregates(state,k=None):
+    total_values = {value.item() for value in state["totals"].values()}
+
+    profits = top_k(state["profit"],k)           # the sums are only final after the last chunk, so the selection happens here
+
+    quantity = state["order_quantity"]
+    average_quantity = (quantity["sum"] / quantity["count"]).rename(quantity.columns.name)
+    average_quantity = top_k(average_quantity,k)
+
+    sellings_on_each_country = top_k(state["country_product"],k)
+    highest_selling_product_by_country = top_k(state["country_product"].swaplevel().sort_index(),k)    # same numbers as [Product,Country], no need to group again
+
+    highest_buying_group = top_k(state["age_group"],k)
+    highest_buying_gender = top_k(state["product_gender"],k)
+    popular_products_by_age = top_k(state["product_age"],k)
+
+    return (total_values,profits,average_quantity,
+            (sellings_on_each_country,highest_selling_product_by_country),
+            (highest_buying_group,highest_buying_gender,popular_products_by_age))
+
+
+'''Streaming analysis: reads, cleans and aggregates the file chunk by chunk'''
+def stream_analysis(file_name,chunk_size,start=None,end=None,k=None):
+    state = stream_partials(file_name,chunk_size,start,end)
+    return finalize_aggregates(state,k) if state else None
+
+
+'''The merged partial aggregates of a file read chunk by chunk'''
+def stream_partials(file_name,chunk_size,start=None,end=None):
+    chunks = load_data_in_chunks(file_name,chunk_size)
+    if chunks is None:
+        return None
+
+    return chunk_partials(chunks,file_name,start,end)
+
+
+'''Cleaning and aggregating chunk after chunk, only the merged sums and counts are kept'''
+def chunk_partials(chunks,file_name,start=None,end=None,state=None):
+    schema = None
+    for chunk in chunks:
+        to_date_time(chunk,verbose=False,file_name=file_name)
+        uniform_string_values(chunk)
+        enforce_data_type(chunk,STRING_COLS,INTEGER_COLS)
+
+        if start is not None and end is not None:
+            chunk = insights_within_time_constraints(chunk,start,end)
+
+        if schema is None:
+            schema = schema_of(chunk)       # every chunk has the same header, so it is resolved once
+
+        state = merge_partials(state,partial_aggregates(chunk,INTEGER_COLS,schema))
+
+    return state
+
+
+'''Where the incremental state of a source file and its manifest are kept'''
+def state_paths(file_name):
+    key = hashlib.blake2b(os.path.abspath(file_name).encode(),digest_size=8).hexdigest()
+    return os.path.join(STATE_DIR,f"{key}.pkl"),os.path.join(STATE_DIR,f"{key}.json")
+
+
+'''Checksums of the start of the file and of the bytes right before the offset, either one changes when the processed part is rewritten'''
+def boundary_hashes(file_name,offset):
+    with open(file_name,"rb") as source:
+        head = source.read(min(offset,CHECK_BYTES))
+        source.seek(max(offset - CHECK_BYTES,0))
+        tail = source.read(offset - max(offset - CHECK_BYTES,0))
+
+    return [hashlib.blake2b(head,digest_size=16).hexdigest(),hashlib.blake2b(tail,digest_size=16).hexdigest()]
+
+
+'''The saved aggregates and position in the file, None when there are none or the file was truncated or rewritten since'''
+def load_refresh_state(file_name):
+    state_path,manifest_path = state_paths(file_name)
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+
+        if manifest["version"] != CLEANING_VERSION:
+            return None
+
+        if os.path.getsize(file_name) < manifest["offset"]:
+            print("The file got shorter since the last run, rebuilding the aggregates")
+            return None
+
+        if boundary_hashes(file_name,manifest["offset"]) != manifest["hashes"]:
+            print("The file was rewritten since the last run, rebuilding the aggregates")
+            return None
+
+        return manifest,pd.read_pickle(state_path)
+
+    except (OSError,ValueError,KeyError):
+        return None
+
+
+'''Saving the aggregates first and the manifest last, through temporary files, so a crash never pairs a manifest with the wrong aggregates'''
+def save_refresh_state(file_name,manifest,state):
+    state_path,manifest_path = state_paths(file_name)
+    try:
+        os.makedirs(STATE_DIR,exist_ok=True)
+        manifest["hashes"] = boundary_hashes(file_name,manifest["offset"])
+
+        pd.to_pickle(state,f"{state_path}.tmp")
+        os.replace(f"{state_path}.tmp",state_path)
+        with open(f"{manifest_path}.tmp","w") as manifest_file:
+            json.dump(manifest,manifest_file,indent=2)
+        os.replace(f"{manifest_path}.tmp",manifest_path)
+
+    except Exception as e:
+        print(f"AN ERROR OCCURED while saving the incremental state: {e}")
+
+
+'''Whether a last line without a line break is a whole row: the file didn't grow since the last run or wasn't written to lately'''
+def tail_settled(file_name,manifest,size):
+    return manifest.get("size") == size or time.time() - os.path.getmtime(file_name) > SETTLE_SECONDS
+
+
+'''Passing the chunks on while keeping the row count of each'''
+def counted(chunks,sizes):
+    for chunk in chunks:
+        sizes.append(len(chunk))
+        yield chunk
+
+
+'''Incremental refresh: only the rows appended since the last run are cleaned and aggregated and merged into the saved state'''
+def incremental_analysis(file_name,k=None):
+    saved = load_refresh_state(file_name)
+    manifest,state = saved if saved else ({"source": os.path.abspath(file_name),"version": CLEANING_VERSION,"offset": 0,"rows": 0,"columns": None},None)
+
+    try:
+        with open(file_name,"rb") as source:
+            source.seek(manifest["offset"])
+            appended = source.read()
+
+    except FileNotFoundError as e:
         print(f"AN ERROR OCCURED: {e}")
+        return None
 
-    to_date_time(df)
-    print("Now the uniform string values")
-    uniform_string_values(df)
-    enforce_data_type(df,STRING_COLS,INTEGER_COLS)
+    size = manifest["offset"] + len(appended)
+    if not tail_settled(file_name,manifest,size):
+        appended = appended[:appended.rfind(b"\n") + 1]       # a row still being written is left for the next run
+    manifest["size"] = size
+
+    if manifest["columns"] is None:
+        body = appended.lstrip(b"\r\n")           # read_csv skips the blank lines before the header, so does this
+        if body:
+            header = body[:body.find(b"\n") + 1] or body
+            manifest["columns"] = list(pd.read_csv(io.BytesIO(header),nrows=0).columns)
+            consumed = len(appended) - len(body) + len(header)
+            manifest["offset"] += consumed
+            appended = appended[consumed:]
+
+    if appended:
+        usecols,types = read_plan(tuple(manifest["columns"]))
+        chunks = pd.read_csv(io.BytesIO(appended),header=None,names=manifest["columns"],usecols=usecols,dtype=text_types(types),chunksize=REFRESH_CHUNK)
+        sizes = []
+        state = chunk_partials(counted(chunks,sizes),file_name,state=state)
+        manifest["offset"] += len(appended)
+        manifest["rows"] += sum(sizes)           # the parsed rows, blank lines aren't rows
+        print(f"Aggregated {sum(sizes)} new rows, {manifest['rows']} in total")
+
+    if state is None:
+        return None
 
-    if(user_preference()):
-        try:
-            START_DATE = pd.to_datetime(input("Enter the start date: "))
-            END_DATE = pd.to_datetime(input("Enter the end date: "))
+    save_refresh_state(file_name,manifest,state)
+    return finalize_aggregates(state,k)
 
-            df = insights_within_time_constraints(df,START_DATE,END_DATE)
-            print(f"\n==showing insights from {START_DATE} till {END_DATE} \n")
 
+'''Batch worker: the partial aggregates of one whole file, sums and counts only so the parent can merge them'''
+def file_partials(file_name,start=None,end=None):
+    try:
+        if CHUNK_SIZE:
+            return stream_partials(file_name,CHUNK_SIZE,start,end)
 
-        except Exception as e:
-            print(f"Unable to convert the date due to: {e} ")
+        df = load_clean_data(file_name)
+        if start is not None and end is not None:
+            df = insights_within_time_constraints(df,start,end)
 
-    total_values = totals(df,INTEGER_COLS)
+        return partial_aggregates(df,INTEGER_COLS,schema_of(df))
+
+    except Exception as e:
+        print(f"AN ERROR OCCURED in {file_name}: {e}")
+        return None
+
+
+'''Batch analysis: every file of a directory or glob is aggregated in its own process and the partials are merged here'''
+def batch_analysis(source,workers=None,start=None,end=None,k=None):
+    files = sorted(glob(os.path.join(source,"*.csv")) if os.path.isdir(source) else glob(source))
+    if not files:
+        print(f"No csv files found in {source}")
+        return None
+
+    state = None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for partial in pool.map(file_partials,files,repeat(start),repeat(end)):
+            if partial:
+                state = merge_partials(state,partial)
+
+    return finalize_aggregates(state,k) if state else None
+
+
+
+'''Printing all the reports'''
+def show_reports(total_values,profits,average_quantity,region,traits):
     print("\n==The totals for each financial transactions is==\n")
     print(total_values)
 
     print("\n==The highest selling product are==\n")
-    print(profit(df))
+    print(profits)
 
 
     print("\n==The average order quantity of each product is==\n")
-    print(average_order_quantity(df))
+    print(average_quantity)
 
 
     print("\n==Insights based on geography==\n")
-    sellings_on_each_country,highest_selling_product_by_country = sales_by_region(df)
+    sellings_on_each_country,highest_selling_product_by_country = region
     print("\n==The selling on each country is==\n")
     print(sellings_on_each_country)
     print("\n==The highest selling product by country is==\n")
@@ -233,7 +641,7 @@ def main():
 
 
     print("\n==The insights based on personal traits are==\n")
-    highest_buying_group,highest_buying_gender,popular_products_by_age = sales_by_personal_traits(df)
+    highest_buying_group,highest_buying_gender,popular_products_by_age = traits
     print("\n==The highest buying age group is==\n")
     print(highest_buying_group)
 
@@ -245,6 +653,91 @@ def main():
 
 
 
+'''Writing all the reports to EXPORT_FILE'''
+def export_reports(total_values,profits,average_quantity,region,traits):
+    try:
+        sheets = {"totals": pd.Series(list(total_values),name="Total"),"profits": profits,"average_quantity": average_quantity,
+                  "sales_by_country": region[0],"top_product_by_country": region[1],
+                  "by_age_group": traits[0],"by_gender": traits[1],"products_by_age_group": traits[2]}
+        written = export_frames(EXPORT_FILE,sheets,index=True)
+        print(f"\n==The reports are written to {', '.join(written)}==")
+
+    except Exception as e:
+        print(f"AN ERROR OCCURED: {e}")
+
+
+            
+'''Asking the time range if the user wants one'''
+def ask_time_range():
+    if(user_preference()):
+        try:
+            START_DATE = pd.to_datetime(input("Enter the start date: "))
+            END_DATE = pd.to_datetime(input("Enter the end date: "))
+            print(f"\n==showing insights from {START_DATE} till {END_DATE} \n")
+            return START_DATE,END_DATE
+
+
+        except Exception as e:
+            print(f"Unable to convert the date due to: {e} ")
+
+    return None,None
+
+
+
+def main():
+    if BATCH_SOURCE:
+        START_DATE,END_DATE = ask_time_range()
+        reports = traced("batch_analysis",batch_analysis,BATCH_SOURCE,BATCH_WORKERS,START_DATE,END_DATE,TOP_K)
+        if reports:
+            show_reports(*reports)
+            if EXPORT_FILE:
+                export_reports(*reports)
+        show_trace()
+        return
+
+    if INCREMENTAL:
+        START_DATE,END_DATE = ask_time_range()
+        if START_DATE is None:
+            reports = traced("incremental_analysis",incremental_analysis,FILE_NAME,TOP_K)
+        else:               # the saved aggregates cover the whole file, a time range is streamed from the start instead
+            reports = traced("stream_analysis",stream_analysis,FILE_NAME,REFRESH_CHUNK,START_DATE,END_DATE,TOP_K)
+        if reports:
+            show_reports(*reports)
+            if EXPORT_FILE:
+                export_reports(*reports)
+        show_trace()
+        return
+
+    if CHUNK_SIZE:
+        START_DATE,END_DATE = ask_time_range()
+        reports = traced("stream_analysis",stream_analysis,FILE_NAME,CHUNK_SIZE,START_DATE,END_DATE,TOP_K)
+        if reports:
+            show_reports(*reports)
+            if EXPORT_FILE:
+                export_reports(*reports)
+        show_trace()
+        return
+
+    try: 
+        df = load_clean_data(FILE_NAME)
+
+    except Exception as e: 
+        print(f"AN ERROR OCCURED: {e}")
+
+    START_DATE,END_DATE = ask_time_range()
+    if START_DATE is not None:
+        df = traced("filter",insights_within_time_constraints,df,START_DATE,END_DATE)
+
+    schema = schema_of(df)
+    reports = run_sections([("totals",totals,(df,INTEGER_COLS,schema)),("profit",profit,(df,schema,TOP_K)),
+                            ("average_order_quantity",average_order_quantity,(df,schema,TOP_K)),
+                            ("sales_by_region",sales_by_region,(df,schema,TOP_K)),("sales_by_personal_traits",sales_by_personal_traits,(df,schema,TOP_K))],REPORT_WORKERS,REPORT_POOL)
+    show_reports(*reports)
+    if EXPORT_FILE:
+        export_reports(*reports)
+    show_trace()
+
+
+
 if __name__ == "__main__":
     main()
-
@@ -1,32 +1,137 @@
 
 
 '''TOP CUSTOMER ANALYZER'''
-import warnings
+import os
+import sys
+import json
+from functools import lru_cache
+from types import MappingProxyType
+import numpy as np
 import pandas as pd
-from rapidfuzz import process
+from rapidfuzz import process, fuzz
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))      # the helpers shared by every analyzer are one folder up
+from analyzer_tools import (CATEGORY_MAX_RATIO, traced, show_trace, file_signature, content_hash, cache_paths, infer_date_format,
+                            date_plan, is_low_cardinality, clean_categories, downcast_numbers, top_k, multi_aggregate, run_sections,
+                            export_frames)
 
 
 FILE_NAME = "for_project4.csv"
 THRESHOLD = 80
+CACHE_DIR = ".clean_cache"     # cleaned copies of the source files, set to None to always clean from scratch
+CACHE_ROW_GROUP = 100_000    # rows per row group of the cleaned copies, the lazy queries skip the groups whose min/max can't match
+TOP_K = None                 # how many customers each ranking shows, None for the full ordering
+CUBE_FILE = ".behaviour_cube.parquet"     # the month x customer cube kept between the monthly reports
+CLEANING_VERSION = 3         # bump it whenever the cleaning steps change, so the old cached copies aren't used anymore
+SCHEMA_TARGETS = ["Customer_ID","Customer_Name","Product","Order_Quantity","Profits","Date","Country","Product_Category"]
+TARGET_TYPES = {"Customer_ID": "int64","Customer_Name": "string","Product": "category","Order_Quantity": "int64","Profits": "float64",
+                "Date": "string","Country": "category","Product_Category": "category"}     # dates stay text until to_date_time parses them
+                                                                                     # "string" keeps gaps missing, str reads them as "None" under pyarrow
+DOWNCAST = True              # keep the ids and quantities in the smallest integer type that holds every value exactly
+MONEY_SCALE = None           # e.g. 100 to keep the profits as whole cents, exact sums without artifacts like 387.59999999999997
+MEMORY_REPORT = False        # print the memory of every number column before and after downcasting
+PARSER_ENGINE = "pyarrow"    # parser of the projected reads, "c" works too when pyarrow isn't installed
+QUERY_REPORTS = {"top_customers": ["Customer_ID","Customer_Name","Product","Order_Quantity","Profits"],
+                 "behavioural_analysis": ["Date","Order_Quantity","Customer_ID","Profits"]}      # the columns each report of a lazy query needs
+FILTER_TARGETS = {"start": "Date","end": "Date","country_name": "Country","product_category": "Product_Category"}
+QUERY_CHUNK = 250_000        # csv rows a lazy query reads at a time when there is no fresh cleaned copy
+REPORT_WORKERS = None        # workers running the report sections side by side, None uses every core, 1 runs them one after another
+REPORT_POOL = "thread"       # "thread" shares the frame as it is, "process" forks workers that inherit it (threads where fork isn't available)
+LAZY_FILTERS = True          # filtered reports run as a lazy query reading only the matching rows, False loads everything and filters after
+EXPORT_FILE = None           # e.g. "customer_reports.xlsx" to also write every report to a workbook, one sheet each
 
 
 
 '''Load the raw data samples'''
 def load_data(file_name):
     try: 
-        df = pd.read_csv(file_name)
-        return df
+        usecols,types = read_plan(tuple(pd.read_csv(file_name,nrows=0).columns))      # only the header is read to plan the real read
+        try:
+            return pd.read_csv(file_name,usecols=usecols,dtype=types,engine=PARSER_ENGINE)
+
+        except (ValueError,TypeError):        # a number column with gaps or text in it, it is read untyped instead
+            text = {col: kind for col,kind in types.items() if kind in ("string","category")} if types else None
+            return pd.read_csv(file_name,usecols=usecols,dtype=text,engine=PARSER_ENGINE)
     
     except Exception as e:
         return f"Error in loading the data due to: {e}"
 
 
+'''Only the columns the analysis needs out of a header, with the types they are read with'''
+def read_plan(header):
+    schema = resolve_schema(header)
+    if not schema:
+        return None,None         # nothing recognised, everything is read and the analysis reports what is missing
+
+    return list(dict.fromkeys(schema.values())),{schema[target]: TARGET_TYPES[target] for target in schema}
+
+
+
+'''The cleaned copy of a source file, None if the source file or the cleaning changed since it was cached'''
+def fresh_cache(file_name):
+    data_path,manifest_path = cache_paths(file_name,CACHE_DIR)
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+
+        if (manifest["version"] != CLEANING_VERSION or manifest.get("money_scale") != stored_money_scale()      # cents and units can't be mixed
+                or manifest.get("downcast") != DOWNCAST):
+            return None
+
+        if manifest["signature"] != file_signature(file_name):       # size or mtime changed, only the content hash can tell if the data did
+            if manifest["hash"] != content_hash(file_name):
+                return None
+
+            manifest["signature"] = file_signature(file_name)          # same data, only touched: remember the new signature so it isn't hashed again
+            with open(manifest_path,"w") as manifest_file:
+                json.dump(manifest,manifest_file,indent=2)
+
+        return data_path if os.path.exists(data_path) else None
+
+    except (FileNotFoundError,KeyError,json.JSONDecodeError):
+        return None
+
+
+'''Loading the cleaned data from the cache, None if it isn't fresh. The columns and the filters are pushed down to
+pyarrow, which skips the row groups whose min/max can't match and only reads the rows and columns asked for'''
+def read_clean_cache(file_name,memory_map=False,columns=None,filters=None):
+    try:
+        data_path = fresh_cache(file_name)
+        if data_path is None:
+            return None
+
+        df = pd.read_parquet(data_path,memory_map=memory_map,columns=columns,filters=filters or None)
+        for col in df.select_dtypes(include="category").columns:
+            if df[col].cat.categories.dtype == object:
+                df[col] = df[col].cat.rename_categories(df[col].cat.categories.astype("string"))     # parquet gives the categories back as object
+
+        return df
+
+    except Exception as e:
+        print(f"Error in reading the cache due to: {e}")
+        return None
+
+
+'''Saving the cleaned data in a columnar file next to a manifest describing the source it came from'''
+def write_clean_cache(file_name,df):
+    data_path,manifest_path = cache_paths(file_name,CACHE_DIR)
+    try:
+        os.makedirs(CACHE_DIR,exist_ok=True)
+        df.to_parquet(data_path,index=False,row_group_size=CACHE_ROW_GROUP)      # small enough groups for the lazy queries to skip
+        with open(manifest_path,"w") as manifest_file:
+            json.dump({"source": os.path.abspath(file_name),"signature": file_signature(file_name),
+                       "hash": content_hash(file_name),"version": CLEANING_VERSION,
+                       "money_scale": stored_money_scale(),"downcast": DOWNCAST},manifest_file,indent=2)
+
+    except Exception as e:
+        print(f"Error in writing the cache due to: {e}")
+
+
 '''Convert the date to datetime object'''
-def to_date_time(df):
-    for cols in df.select_dtypes(include="object").columns:
+def to_date_time(df,file_name=None):
+    for cols,fmt in date_plan(df,file_name).items():
         try: 
-            warnings.simplefilter(action="ignore",category=UserWarning)
-            df[cols] = pd.to_datetime(df[cols])
+            df[cols] = pd.to_datetime(df[cols],format=fmt,errors="coerce")      # the few cells the format doesn't fit become NaT
 
         except:
             pass
@@ -34,10 +139,18 @@ def to_date_time(df):
     return df
         
 
+
+
 '''clean the data'''
-def clean_text(df):
-        for cols in df.select_dtypes(include="object").columns:
+def clean_text(df,categorical=True):
+        for cols in df.select_dtypes(include=["object","string","category"]).columns:
             try:
+                if categorical and is_low_cardinality(df[cols]):
+                    as_category = df[cols].astype("category")
+                    if len(as_category.cat.categories) <= CATEGORY_MAX_RATIO * len(as_category):     # the sample can lie, check the whole column too
+                        df[cols] = clean_categories(as_category)
+                        continue
+
                 df[cols] = df[cols].str.strip().str.title()
 
 
@@ -49,8 +162,51 @@ def clean_text(df):
 
 
 
-'''Proceed based on the requirement of the user'''
-def user_requirements(df):
+'''Load the cleaned data, from the cache when the raw file didn't change'''
+def load_clean_data(file_name,memory_map=False):
+    if CACHE_DIR:
+        df = traced("load_cache",read_clean_cache,file_name,memory_map)
+        if df is not None:
+            return df
+
+    df = traced("load",load_data,file_name)
+    if isinstance(df,str):
+        return df
+
+    traced("datetime",to_date_time,df,file_name)
+    clean_columns(df)
+    if CACHE_DIR:
+        write_clean_cache(file_name,df)
+
+    return df
+
+
+'''The cleaning that follows the dates: the text columns, then the number columns are downcast'''
+def clean_columns(df):
+    traced("strings",clean_text,df)
+    if DOWNCAST:
+        schema = resolve_schema(tuple(df.columns))
+        numbers = [schema[target] for target in ("Customer_ID","Order_Quantity") if target in schema]
+        money = [schema["Profits"]] if MONEY_SCALE and "Profits" in schema else []
+        traced("downcast",downcast_numbers,df,numbers,money,MONEY_SCALE,MEMORY_REPORT)
+
+    return df
+
+
+
+'''The scale the money columns are stored with, None when they stay as they were read'''
+def stored_money_scale():
+    return MONEY_SCALE if DOWNCAST else None
+
+
+'''Money sums back in units, money columns only hold whole numbers when they were stored as fixed point'''
+def money_units(values):
+    return values / MONEY_SCALE if stored_money_scale() and values.dtype.kind in "iu" else values
+
+
+
+'''Asking the user which filters to apply, an empty dict for the unfiltered data'''
+def ask_filters():
     while(True):
         user_choice = input("==Do you want Filtered(F) or Unfiltered(U) data==: ").upper()
 
@@ -59,20 +215,21 @@ def user_requirements(df):
 
                 try:
                     print("=====Preceiding with the filtered datas====\n")
-                    apply_filter = input("Enter what you want to apply filter on: \n Dates (D), Country (C), Product_Category(P): ").upper()
-                    if apply_filter == "D":
-                        start_date = pd.to_datetime(input("Enter the starting date: "))
-                        end_date = pd.to_datetime(input("Enter  the end date: "))
-                        return filter_by_date(df,start_date,end_date)
-                        
-
-                    elif apply_filter == "C":
-                        country_name = input("Enter the country name: ").title()
-                        return filter_by_country(df,country_name)
-
-                    elif apply_filter == "P":
-                        product_category = input("Enter the product category: ").title()
-                        return filter_by_product_category(df,product_category)
+                    apply_filter = input("Enter what you want to apply filter on (combine them like DC for both): \n Dates (D), Country (C), Product_Category(P): ").upper()
+                    if apply_filter and set(apply_filter) <= {"D","C","P"}:
+                        criteria = {}
+                        if "D" in apply_filter:
+                            criteria["start"] = pd.to_datetime(input("Enter the starting date: "))
+                            criteria["end"] = pd.to_datetime(input("Enter  the end date: "))
+
+                        if "C" in apply_filter:
+                            criteria["country_name"] = input("Enter the country name: ").title()
+
+                        if "P" in apply_filter:
+                            criteria["product_category"] = input("Enter the product category: ").title()
+
+                        return criteria
+
                     else: 
                         print("Wrong command")
 
@@ -80,7 +237,7 @@ def user_requirements(df):
                     return f"Error in gathering the filters due to {e}"
 
             elif user_choice == "U":
-                return df
+                return {}
             
             else:
                 print("Wrong command, press either (F) or (U)")
@@ -92,39 +249,75 @@ def user_requirements(df):
 
 
 
+'''Proceed based on the requirement of the user'''
+def user_requirements(df,schema=None,index=None,criteria=None):
+    criteria = ask_filters() if criteria is None else criteria
+    if isinstance(criteria,str) or not criteria:
+        return criteria or df
+
+    if index:
+        return traced("filter",query_filter_index,df,index,**criteria)         # every filter answered together from the index
+
+    if "start" in criteria:
+        df = traced("filter_by_date",filter_by_date,df,criteria["start"],criteria["end"],schema)
+    if "country_name" in criteria:
+        df = traced("filter_by_country",filter_by_country,df,criteria["country_name"],schema)
+    if "product_category" in criteria:
+        df = traced("filter_by_product_category",filter_by_product_category,df,criteria["product_category"],schema)
+    return df
+
+
+
+'''Resolve every target column in one go (one score matrix) and cache it on the column names'''
+@lru_cache(maxsize=64)
+def resolve_schema(columns,targets=tuple(SCHEMA_TARGETS),threshold=THRESHOLD):
+    scores = process.cdist(targets,columns,scorer=fuzz.WRatio)      # same scorer as extractOne
+    best = scores.argmax(axis=1)
+
+    matched = {target: columns[best[row]] for row,target in enumerate(targets) if scores[row,best[row]] >= threshold}
+    return MappingProxyType(matched)
+
+
 
 '''A reuseable fuzzy matcher function'''
-def fuzzy_matcher(df,targets,threshold):
+def fuzzy_matcher(df,targets,threshold,schema=None):
     matched = {}
 
     try:
-        for target in  targets: 
-            match,score,_ = process.extractOne(target,df.columns)
+        if schema is None:
+            schema = resolve_schema(tuple(df.columns),tuple(targets),threshold)
 
-
-            if score>= threshold:
-                matched[target] = match
+        for target in  targets: 
+            if target in schema:
+                matched[target] = schema[target]
 
         
     except Exception as e:
         return f"Error in fuzzymatching due to {e}"
 
-    return matched if len(matched) == len(targets) else None
+    return matched if len(matched) == len(set(targets)) else None
 
 
 
 '''Insights based on customers'''
-def top_customers(df):
+def top_customers(df,schema=None,k=None):
     targets = ["Customer_ID","Customer_Name","Product","Order_Quantity","Profits"]
-    match = fuzzy_matcher(df,targets,THRESHOLD)
+    match = fuzzy_matcher(df,targets,THRESHOLD,schema)
 
     if match:
         try: 
-            highest_ordering_customer = df.groupby(match["Customer_ID"])[match["Order_Quantity"]].sum().sort_values(ascending=False)
+            highest_ordering_customer,top_purchased_items_individually,most_profitable_customer = multi_aggregate(df,[
+                ([match["Customer_ID"]],match["Order_Quantity"],"sum"),
+                ([match["Customer_ID"],match["Customer_Name"],match["Product"]],match["Order_Quantity"],"sum"),
+                ([match["Customer_ID"],match["Customer_Name"]],match["Profits"],"sum"),
+            ])
+            most_profitable_customer = money_units(most_profitable_customer)
 
-            top_purchased_items_individually = df.groupby([match["Customer_ID"],match["Customer_Name"],match["Product"]]) [match["Order_Quantity"]].sum().reset_index().sort_values(by = match["Order_Quantity"],ascending=False)
+            highest_ordering_customer = top_k(highest_ordering_customer,k)
 
-            most_profitable_customer = df.groupby([match["Customer_ID"],match["Customer_Name"]])[match["Profits"]].sum().reset_index().sort_values(by=match["Profits"],ascending=False)
+            top_purchased_items_individually = top_k(top_purchased_items_individually.reset_index(),k,by = match["Order_Quantity"])
+
+            most_profitable_customer = top_k(most_profitable_customer.reset_index(),k,by=match["Profits"])
     
             return highest_ordering_customer,top_purchased_items_individually,most_profitable_customer
 
@@ -134,24 +327,159 @@ def top_customers(df):
 
 
 
+'''Month x customer cube: the number of orders, the quantity and the profit of every customer in every month'''
+def build_cube(df,schema=None):
+    targets = ["Date","Order_Quantity","Customer_ID","Profits"]
+    match = fuzzy_matcher(df,targets,THRESHOLD,schema)
+    if match:
+        try:
+            rows = pd.DataFrame({"month": df[match["Date"]].dt.to_period("M"),match["Customer_ID"]: df[match["Customer_ID"]],
+                                 "quantity": df[match["Order_Quantity"]],"profit": df[match["Profits"]]})
+
+            keys = ["month",match["Customer_ID"]]         # orders without a date have no month, so they are left out of the cube
+            orders,quantity,profit = multi_aggregate(rows,[(keys,None,"size"),(keys,"quantity","sum"),(keys,"profit","sum")])
+
+            return pd.DataFrame({"orders": orders,"quantity": quantity,"profit": money_units(profit)})
+
+        except Exception as e:
+            print(f"Error in building the cube due to {e}")
+            return None
+
+
+
+'''Adding new orders to a cube, only the new rows are aggregated'''
+def update_cube(cube,new_orders,schema=None):
+    new_cube = build_cube(new_orders,schema)
+    if cube is None or new_cube is None:
+        return new_cube if cube is None else cube
+
+    combined = pd.concat([cube,new_cube])
+    return combined.groupby(level=[0,1]).sum()       # a month that is in both (a half month appended later) is just added up
+
+
+
+'''Saving the cube so next month's report only has to add the new orders, the files already added to it are kept with it'''
+def save_cube(cube,cube_file=CUBE_FILE,sources=None):
+    try:
+        saved = cube.reset_index()
+        saved["month"] = saved["month"].astype(str)
+        saved.attrs["sources"] = sources or []         # written into the parquet metadata, so the list can't drift from the cube
+        saved.to_parquet(cube_file,index=False)
+
+    except Exception as e:
+        print(f"Error in saving the cube due to {e}")
+
+
+
+'''Loading the saved cube, None if there is none yet. The files it was built from are in cube.attrs["sources"]'''
+def load_cube(cube_file=CUBE_FILE):
+    try:
+        saved = pd.read_parquet(cube_file)
+        saved["month"] = pd.PeriodIndex(saved["month"],freq="M")
+        cube = saved.set_index(list(saved.columns[:2]))
+        cube.attrs["sources"] = saved.attrs.get("sources",[])       # cubes saved before the sources were recorded have none
+        return cube
+
+    except FileNotFoundError:
+        return None
+
+
+
+'''The record a file leaves in the cube's sources: where it is, how many bytes of it were added and their hash'''
+def source_record(file_name):
+    return {"path": os.path.abspath(file_name),"size": os.path.getsize(file_name),"hash": content_hash(file_name)}
+
+
+
+'''What a file adds to a cube built from sources: "applied" when its content is already in it, "appended" when the
+file grew since it was added (only the rows after the recorded ones are new), "new" otherwise'''
+def source_status(file_name,record,sources):
+    for source in sources:
+        if source["hash"] == record["hash"]:           # the same file again, or a copy of it under another name
+            return "applied",source
+
+    for source in sources:
+        if (source["path"] == record["path"] and record["size"] > source["size"]
+                and content_hash(file_name,source["size"]) == source["hash"]):
+            return "appended",source
+
+    return "new",None
+
+
+
+'''Monthly report from the saved history plus a file of new orders, a file (or the part of it) that was already added
+is skipped so running the refresh twice doesn't count the same orders twice'''
+def refresh_cube(new_orders_file,cube_file=CUBE_FILE):
+    cube = load_cube(cube_file)
+    sources = cube.attrs["sources"] if cube is not None else []
+    record = source_record(new_orders_file)
+    status,source = source_status(new_orders_file,record,sources)
+    if status == "applied":
+        print(f"{new_orders_file} is already in the cube, nothing to add")
+        return cube
+
+    new_orders = load_clean_data(new_orders_file)
+    if isinstance(new_orders,str):
+        print(new_orders)
+        return cube
+
+    record["rows"] = len(new_orders)
+    if status == "appended":
+        new_orders = new_orders.iloc[source["rows"]:]        # the cleaning keeps every row, so the first ones are the ones already added
+        sources = [kept for kept in sources if kept is not source]
+
+    updated = update_cube(cube,new_orders,resolve_schema(tuple(new_orders.columns)))
+    if updated is None or updated is cube:        # nothing could be built from the file, so it isn't recorded either
+        return cube
+
+    updated.attrs["sources"] = sources + [record]
+    save_cube(updated,cube_file,updated.attrs["sources"])
+    return updated
+
+
+
+'''Rollups of the cube per month: orders, quantity, profit and the number of active customers'''
+def monthly_summary(cube):
+    summary = cube.groupby(level="month")[["orders","quantity","profit"]].sum()
+    summary["active_customers"] = cube.groupby(level="month").size()
+    summary["quantity_per_order"] = summary["quantity"] / summary["orders"]
+    return summary
+
+
+
+'''The behaviour reports and the monthly summary, both rolled up from one cube'''
+def behaviour_reports(df,schema=None,k=None):
+    cube = build_cube(df,schema)
+    if cube is None:
+        return "Error in analyzing behaviour due to the month x customer cube not being built"
+
+    return behavioural_analysis(df,schema,cube,k),monthly_summary(cube)
+
+
 
 '''Behavioural analysis of customer'''
-def behavioural_analysis(df):
-    targets = ["Date","Order_Quantity","Customer_ID"]
-    match = fuzzy_matcher(df,targets,THRESHOLD)
+def behavioural_analysis(df,schema=None,cube=None,k=None):
+    targets = ["Order_Quantity","Customer_ID"]
+    match = fuzzy_matcher(df,targets,THRESHOLD,schema) if df is not None else {"Order_Quantity": "Order_Quantity"}
     if match:
         try: 
-            df["month"] = df[match["Date"]].dt.to_period("M")    #Adding a month col in df to make filtering by month easier
+            if cube is None:
+                cube = build_cube(df,schema)       # everything below is rolled up from the cube, not from the rows
+            quantity = match["Order_Quantity"]
+            by_month = cube.groupby(level="month")
 
-            no_of_monthly_orders =  df.groupby("month")[match["Order_Quantity"]].sum()
+            no_of_monthly_orders = by_month["quantity"].sum().rename(quantity)
 
-            frequency_of_monthly_orders = df.groupby("month")[match["Order_Quantity"]].size()
+            frequency_of_monthly_orders = by_month["orders"].sum().rename(quantity)
 
-            customers_monthly_order_frequency = df.groupby(["month",match["Customer_ID"]])[match["Order_Quantity"]].size()
+            customers_monthly_order_frequency = cube["orders"].rename(quantity)
 
-            customers_total_orders_monthlty = df.groupby(["month",match["Customer_ID"]])[match["Order_Quantity"]].sum().sort_values(ascending=False)
+            customers_total_orders_monthlty = top_k(cube["quantity"].rename(quantity),k)
             
-            customer_counts = df.groupby(match["Customer_ID"]).size()
+            if df is not None:        # from the rows, the cube leaves out the orders without a date and they are visits too
+                customer_counts = multi_aggregate(df,[([match["Customer_ID"]],None,"size")])[0]
+            else:
+                customer_counts = cube.groupby(level=1)["orders"].sum()
             repeated_customers = customer_counts[customer_counts>1].reset_index(name = "No of visits")
 
             return no_of_monthly_orders,frequency_of_monthly_orders,customers_monthly_order_frequency,customers_total_orders_monthlty,repeated_customers
@@ -161,10 +489,57 @@ def behavioural_analysis(df):
 
 
 
+'''Filter index built once after cleaning: sorted dates for range queries and the row positions of every category value'''
+def build_filter_index(df,schema=None):
+    targets = ["Date","Country","Product_Category"]
+    match = fuzzy_matcher(df,targets,THRESHOLD,schema)
+    if match:
+        try:
+            dates = df[match["Date"]].to_numpy()
+            dated_rows = np.flatnonzero(~np.isnat(dates))            # rows without a date can never be inside a date range
+            date_order = dated_rows[np.argsort(dates[dated_rows],kind="stable")]
+
+            index = {"date_order": date_order,"sorted_dates": dates[date_order]}
+            for target in ["Country","Product_Category"]:
+                codes,values = pd.factorize(df[match[target]])
+                order = np.argsort(codes,kind="stable")                 # stable, so the positions of each value stay sorted
+                bounds = np.searchsorted(codes[order],np.arange(len(values) + 1))
+                index[target] = {value: order[bounds[code]:bounds[code + 1]] for code,value in enumerate(values)}
+
+            return index
+
+        except Exception as e:
+            print(f"Error in building the filter index due to {e}")
+            return None
+
+
+
+'''Answer any combination of the filters from the index, by intersecting the row positions'''
+def query_filter_index(df,index,start=None,end=None,country_name=None,product_category=None):
+    positions = None
+
+    if start is not None or end is not None:
+        sorted_dates = index["sorted_dates"]
+        low = 0 if start is None else np.searchsorted(sorted_dates,pd.Timestamp(start).to_datetime64(),side="left")
+        high = len(sorted_dates) if end is None else np.searchsorted(sorted_dates,pd.Timestamp(end).to_datetime64(),side="right")
+        positions = np.sort(index["date_order"][low:high])
+
+    for target,value in [("Country",country_name),("Product_Category",product_category)]:
+        if value is not None:
+            rows = index[target].get(value,np.array([],dtype=np.intp))
+            positions = rows if positions is None else np.intersect1d(positions,rows,assume_unique=True)
+
+    return df if positions is None else df.iloc[positions]
+
+
+
     '''apply filter based on given constraints (if it is needed)'''
-def filter_by_date(df,start,end):
+def filter_by_date(df,start,end,schema=None,index=None):
+    if index:
+        return query_filter_index(df,index,start=start,end=end)
+
     targets = ["Date"]
-    match = fuzzy_matcher(df,targets,THRESHOLD)
+    match = fuzzy_matcher(df,targets,THRESHOLD,schema)
     if match:
         try:
             filtered_df = df[  (df[match["Date"]] >= start) & ( df[match["Date"]] <= end   ) ]
@@ -174,9 +549,12 @@ def filter_by_date(df,start,end):
 
 
 
-def filter_by_country(df,country_name):
+def filter_by_country(df,country_name,schema=None,index=None):
+    if index:
+        return query_filter_index(df,index,country_name=country_name)
+
     targets = ["Country"]
-    match = fuzzy_matcher(df,targets,THRESHOLD)
+    match = fuzzy_matcher(df,targets,THRESHOLD,schema)
     if match:
         try:
             filtered_df = df[ df[match["Country"]] == country_name]
@@ -187,9 +565,12 @@ def filter_by_country(df,country_name):
 
 
 
-def filter_by_product_category(df,product_category):
+def filter_by_product_category(df,product_category,schema=None,index=None):
+    if index:
+        return query_filter_index(df,index,product_category=product_category)
+
     targets = ["Product_Category"]
-    match = fuzzy_matcher(df,targets,THRESHOLD)
+    match = fuzzy_matcher(df,targets,THRESHOLD,schema)
     if match:
         try:
             filtered_df = df[ df[match["Product_Category"]] == product_category]
@@ -199,27 +580,153 @@ def filter_by_product_category(df,product_category):
             return f"Error in filtering the data by product category due to {e}"
 
 
+'''A lazy query on a source file: nothing is read yet, the filters, columns and reports are only written down in the plan'''
+def scan(file_name):
+    return {"source": file_name,"filters": {},"columns": [],"reports": []}
 
-def main():
-    
-    try:
-     df = load_data(FILE_NAME)
 
-    except Exception as e:
-        print(f"error in calling the data loading function due to: {e}")
+'''Adding filters to a plan (a date range, a country, a product category), a new plan is returned'''
+def where(plan,start=None,end=None,country_name=None,product_category=None):
+    given = {"start": start,"end": end,"country_name": country_name,"product_category": product_category}
+    return {**plan,"filters": {**plan["filters"],**{key: value for key,value in given.items() if value is not None}}}
+
+
+'''Adding the target columns (names from SCHEMA_TARGETS) the query gives back'''
+def select(plan,*targets):
+    return {**plan,"columns": list(dict.fromkeys(plan["columns"] + list(targets)))}
+
+
+'''Adding the reports (top_customers, behavioural_analysis) the query runs on the surviving rows'''
+def report(plan,*reports):
+    unknown = [name for name in reports if name not in QUERY_REPORTS]
+    if unknown:
+        raise ValueError(f"Unknown reports {unknown}, choose from {list(QUERY_REPORTS)}")
+    return {**plan,"reports": list(dict.fromkeys(plan["reports"] + list(reports)))}
+
+
+'''Optimizing a plan: only the columns the filters, the selection and the reports need are read, and the filters become
+predicates pushed into the reader. The category ones go first, they are answered from the distinct values of a chunk'''
+def optimize(plan):
+    schema = resolve_schema(tuple(pd.read_csv(plan["source"],nrows=0).columns))
+    needed = [FILTER_TARGETS[key] for key in plan["filters"]] + plan["columns"] + [target for name in plan["reports"] for target in QUERY_REPORTS[name]]
+    missing = [target for target in dict.fromkeys(needed) if target not in schema]
+    if missing:
+        raise KeyError(f"no column found for {missing}")
 
-    to_date_time(df)
-    clean_text(df)
+    filters = plan["filters"]
+    predicates = [(schema[FILTER_TARGETS[key]],"==",filters[key]) for key in ("country_name","product_category") if key in filters]
+    predicates += [(schema["Date"],operator,pd.Timestamp(filters[key])) for key,operator in (("start",">="),("end","<=")) if key in filters]
 
+    return {"source": plan["source"],"schema": schema,"columns": list(dict.fromkeys(schema[target] for target in needed)),
+            "selected": [schema[target] for target in plan["columns"]],"predicates": predicates,"reports": plan["reports"],
+            "reader": "cache" if CACHE_DIR and fresh_cache(plan["source"]) else "csv"}
 
+
+'''Reading the csv chunk by chunk when there is no fresh cleaned copy: the predicates run on each raw chunk first and only
+the surviving rows get their dates parsed and their text cleaned, a chunk where nothing matches is dropped right away'''
+def scan_csv(optimized):
+    columns,schema = optimized["columns"],optimized["schema"]
+    date_col = schema.get("Date") if schema.get("Date") in columns else None
+    types = {schema[target]: kind for target,kind in TARGET_TYPES.items() if target in schema and schema[target] in columns and kind in ("string","category")}
+    types.update({col: "category" for col,operator,_ in optimized["predicates"] if operator == "=="})     # compared on the distinct values only
+
+    parts,fmt,survivors = [],None,None
+    for chunk in pd.read_csv(optimized["source"],usecols=columns,dtype=types,chunksize=QUERY_CHUNK,float_precision="round_trip"):      # the same floats as the pyarrow reads
+        keep = np.ones(len(chunk),dtype=bool)
+        for col,operator,value in optimized["predicates"]:
+            if operator == "==":
+                matching = np.append(chunk[col].cat.categories.str.strip().str.title() == value,False)     # the extra False is for the missing values (code -1)
+                keep &= matching[chunk[col].cat.codes.to_numpy()]
+
+        survivors = chunk[keep]
+        if date_col:
+            fmt = fmt or infer_date_format(chunk[date_col])
+            survivors = survivors.assign(**{date_col: pd.to_datetime(survivors[date_col],format=fmt,errors="coerce")})
+            for col,operator,value in optimized["predicates"]:
+                if operator == ">=":
+                    survivors = survivors[survivors[col] >= value]
+                elif operator == "<=":
+                    survivors = survivors[survivors[col] <= value]
+
+        if len(survivors):
+            parts.append(survivors)
+
+    if survivors is None:
+        return pd.DataFrame(columns=columns)          # a header without any rows
+
+    return clean_columns(pd.concat(parts or [survivors],ignore_index=True))
+
+
+'''Running a lazy query, from the cleaned cache when it is fresh and from the csv otherwise'''
+def run_query(plan,k=None):
     try:
-        df = user_requirements(df)
-        
+        optimized = optimize(plan)
+        df = None
+        if optimized["reader"] == "cache":
+            df = traced("load_cache",read_clean_cache,plan["source"],columns=optimized["columns"],filters=optimized["predicates"])
+        if df is None:
+            df = traced("scan",scan_csv,optimized)
+
+        schema = optimized["schema"]
+        results = {"rows": df[optimized["selected"]] if optimized["selected"] else df}
+        sections = {"top_customers": top_customers,"behavioural_analysis": behaviour_reports}
+        reports = run_sections([(name,sections[name],(df,schema,k)) for name in optimized["reports"]],REPORT_WORKERS,REPORT_POOL)
+        results.update(zip(optimized["reports"],reports))
+        for name in optimized["reports"]:
+            if isinstance(results[name],str):
+                return results[name]
+        if "behavioural_analysis" in results:
+            results["behavioural_analysis"],results["monthly_summary"] = results["behavioural_analysis"]
+
+        return results
+
     except Exception as e:
-        print(f"Error {e}")
+        return f"Error in running the query due to {e}"
 
 
-    highest_ordering_customer,top_purchased_items_individually,most_profitable_customer = top_customers(df)
+
+def main():
+    criteria = ask_filters() if LAZY_FILTERS else None
+    if isinstance(criteria,str):
+        print(criteria)
+        return
+
+    if criteria:          # a filtered report only reads and cleans the rows it keeps
+        plan = report(where(scan(FILE_NAME),**criteria),"top_customers","behavioural_analysis")
+        results = run_query(plan,TOP_K)
+        if isinstance(results,str):
+            print(results)
+            return
+
+        customers,behaviour,summary = results["top_customers"],results["behavioural_analysis"],results["monthly_summary"]
+
+    else:
+        try:
+         df = load_clean_data(FILE_NAME)
+
+        except Exception as e:
+            print(f"error in calling the data loading function due to: {e}")
+        schema = resolve_schema(tuple(df.columns))
+
+        if criteria is None:
+            index = traced("filter_index",build_filter_index,df,schema)
+            try:
+                df = user_requirements(df,schema,index)
+            
+            except Exception as e:
+                print(f"Error {e}")
+
+        customers,behaviour = run_sections([("top_customers",top_customers,(df,schema,TOP_K)),
+                                            ("behavioural_analysis",behaviour_reports,(df,schema,TOP_K))],REPORT_WORKERS,REPORT_POOL)
+        for result in (customers,behaviour):
+            if isinstance(result,str):
+                print(result)
+                return
+        behaviour,summary = behaviour
+
+    highest_ordering_customer,top_purchased_items_individually,most_profitable_customer = customers
+    no_of_monthly_orders,frequency_of_monthly_orders,customers_monthly_order_frequency,customers_total_orders_monthlty,repeated_customers = behaviour
+
     print("\nThe highest ordering customers are: ")
     print(highest_ordering_customer)
     print("\nThe most purchased items by individual: ")
@@ -227,9 +734,6 @@ def main():
     print("\nThe most profitable customers are: ")
     print(most_profitable_customer)
 
-
-    no_of_monthly_orders,frequency_of_monthly_orders,customers_monthly_order_frequency,customers_total_orders_monthlty,repeated_customers = behavioural_analysis(df)
-    
     print("\nThe no of monthly orders are: ")
     print(no_of_monthly_orders)
     print("\nThe frequency of monthly orders are: ")
@@ -240,6 +744,21 @@ def main():
     print(customers_total_orders_monthlty)
     print("\nThe customer who visited us again for purchasing are: ")
     print(repeated_customers)
+    print("\nThe monthly summary is: ")
+    print(summary)
+
+    if EXPORT_FILE:
+        try:
+            sheets = {"highest_ordering": highest_ordering_customer,"top_items": top_purchased_items_individually,
+                      "most_profitable": most_profitable_customer,"monthly_orders": no_of_monthly_orders,
+                      "order_frequency": frequency_of_monthly_orders,"customer_frequency": customers_monthly_order_frequency,
+                      "customer_orders": customers_total_orders_monthlty,"repeated_customers": repeated_customers,"monthly_summary": summary}
+            written = export_frames(EXPORT_FILE,sheets,index=True)
+            print(f"\nThe reports are written to {', '.join(written)}")
+
+        except Exception as e:
+            print(f"Error in exporting the reports due to {e}")
+    show_trace()
 
 
 
@@ -2,33 +2,84 @@
 
 # '''Movie  Rating Analyzer'''
 
+import os
+import sys
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
 import pandas as pd
-from rapidfuzz import process
+from rapidfuzz import process, fuzz
 import streamlit as st
 
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))      # the helpers shared by every analyzer are one folder up
+from analyzer_tools import CATEGORY_MAX_RATIO, is_low_cardinality, clean_categories
+
 
 THRESHOLD = 80
+CACHE_MAX_ENTRIES = 4                  # cleaned uploads kept in memory across reruns
+CACHE_MAX_BYTES = 1024 * 1024 * 1024   # total memory of the kept uploads, the least recently used ones go first
+RESULT_CACHE_MAX_ENTRIES = 64          # analysis results kept per session, least recently used go first
+PAGE_SIZE = 50                         # rows sent to the browser at a time
 TARGETS = ["Title","Genre","Year","Rating","Votes","Runtime","Country","Language","Review"]
+TARGET_TYPES = {"Title": "string","Genre": "string","Rating": "float64","Votes": "int64","Runtime": "int64",
+                "Country": "category","Language": "category","Review": "string"}       # the year is left to clean_dates, it can come with spaces
+                                                                           # "string" keeps gaps missing, str reads them as "None" under pyarrow
+PARSER_ENGINE = "pyarrow"              # parser of the projected reads, "c" works too when pyarrow isn't installed
+BACKGROUND_MIN_BYTES = 20 * 1024 * 1024  # uploads bigger than this are read in the background, the smaller ones right away
+INGEST_CHUNK = 100_000                 # rows parsed at a time by a background read
+PROGRESS_REFRESH = 0.5                 # seconds between two looks at a background read
 
 
 # '''Loads the file and makes it a dataframe'''
 def load_data(file_path):
     try:
-        df = pd.read_csv(file_path)
-        return df
+        usecols,types = read_plan(tuple(pd.read_csv(file_path,nrows=0).columns))      # only the header is read to plan the real read
+        try:
+            rewind(file_path)
+            return pd.read_csv(file_path,usecols=usecols,dtype=types,engine=PARSER_ENGINE)
+
+        except (ValueError,TypeError):        # a number column with gaps or text in it, it is read untyped instead
+            rewind(file_path)
+            text = {col: kind for col,kind in types.items() if kind in ("string","category")} if types else None
+            return pd.read_csv(file_path,usecols=usecols,dtype=text,engine=PARSER_ENGINE)
   
     except Exception as e:
         return f"Error in loading the data due to {e}"
+
+
+# '''Uploads are read more than once, so they go back to the start before every read'''
+def rewind(file_path):
+    if hasattr(file_path,"seek"):
+        file_path.seek(0)
+
+
+# '''Only the target columns out of a header, with the types they are read with'''
+def read_plan(header):
+    schema = resolve_schema(header,tuple(TARGETS),THRESHOLD)
+    if not all(is_matched for _,_,is_matched in schema):
+        return None,None         # everything is read, so fuzzy_matcher can tell which names didn't match
+
+    return list(dict.fromkeys(match for _,match,_ in schema)),{match: TARGET_TYPES[target] for target,match,_ in schema if target in TARGET_TYPES}
     
+# '''Scores every target against every column in one matrix, cached on the column names so reruns don't score again'''
+@lru_cache(maxsize=64)
+def resolve_schema(columns,targets,threshold):
+    scores = process.cdist(targets,columns,scorer=fuzz.WRatio)      # WRatio is the default scorer of extractOne
+    best = scores.argmax(axis=1)
+    return tuple((target,columns[best[row]],scores[row,best[row]] >= threshold) for row,target in enumerate(targets))
+
+
 # '''A fuzzymatcher to make sure that slightly changed column names also matches'''
 def fuzzy_matcher(df,targets,threshold):
     matched = {}
     unmatched = []
     try:
-        for target in targets:
-            match,score,_ = process.extractOne(target,df.columns)
+        for target,match,is_matched in resolve_schema(tuple(df.columns),tuple(targets),threshold):
 
-            if score >= threshold:
+            if is_matched:
                 matched[target] = match
 
             else:
@@ -46,9 +97,15 @@ def fuzzy_matcher(df,targets,threshold):
 
 
 # '''cleans the strings columns from the dataset'''
-def clean_string_columns(df):
-    for string_col in df.select_dtypes(include="object").columns:
+def clean_string_columns(df,categorical=True):
+    for string_col in df.select_dtypes(include=["object","string","category"]).columns:
         try:
+            if categorical and is_low_cardinality(df[string_col]):
+                as_category = df[string_col].astype("category")
+                if len(as_category.cat.categories) <= CATEGORY_MAX_RATIO * len(as_category):     # the sample can lie, check the whole column too
+                    df[string_col] = clean_categories(as_category)
+                    continue
+
             df[string_col] = df[string_col].str.strip().str.title()
             
             
@@ -70,6 +127,149 @@ def clean_dates(df,date):
 
 
 
+# '''The cleaned uploads shared by every rerun and session of the app, with the background reads still going on'''
+@st.cache_resource
+def ingestion_cache():
+    return {"entries": OrderedDict(),"jobs": {},"lock": threading.Lock()}
+
+
+# '''Cleans a loaded upload in place and builds its genre index'''
+def clean_upload(df,ready_to_use_columns):
+    clean_string_columns(df)
+    clean_dates(df,ready_to_use_columns["Year"])
+    return build_genre_index(df,ready_to_use_columns["Genre"])
+
+
+# '''Keeps a cleaned upload in the cache, the least recently used ones go first once the limits are passed'''
+def cache_upload(cache,content_key,df,ready_to_use_columns,genre_index):
+    with cache["lock"]:
+        entries = cache["entries"]
+        entries[content_key] = (df,ready_to_use_columns,genre_index,int(df.memory_usage(deep=True).sum()) + genre_index["matrix"].nbytes)
+        while len(entries) > 1 and (len(entries) > CACHE_MAX_ENTRIES or sum(entry[3] for entry in entries.values()) > CACHE_MAX_BYTES):
+            entries.popitem(last=False)
+
+
+# '''Loads and cleans an upload only once per file content, the reruns just take it from the cache. Big uploads are read
+# in the background, until they are done the first cleaned chunk is given back together with the job reading the rest'''
+def ingest(uploaded_file):
+    previous = st.session_state.file
+    file_id = getattr(uploaded_file,"file_id",None)
+    if file_id is not None and previous and previous[0] == file_id:
+        content_key = previous[1]          # same upload as the last rerun, no need to hash it again
+        content = None
+    else:
+        content = uploaded_file.getvalue()
+        content_key = hashlib.blake2b(content,digest_size=16).hexdigest()
+        st.session_state.file = (file_id,content_key)
+
+    cache = ingestion_cache()
+    with cache["lock"]:
+        if content_key in cache["entries"]:
+            cache["entries"].move_to_end(content_key)
+            df,ready_to_use_columns,genre_index,_ = cache["entries"][content_key]
+            return df,ready_to_use_columns,genre_index,None
+
+        job = cache["jobs"].get(content_key)
+        if job is not None and job["error"]:
+            del cache["jobs"][content_key]          # reported once, the next rerun tries again
+            return job["error"],None,None,None
+
+    if job is None:
+        if content is None:
+            content = uploaded_file.getvalue()
+
+        if len(content) >= BACKGROUND_MIN_BYTES and header_matches(content):
+            job = start_ingestion(cache,content,content_key)
+        else:
+            return ingest_now(cache,content,content_key)+(None,)
+
+    preview = job["preview"]
+    return (preview[0],preview[1],None,job) if preview else (None,None,None,job)
+
+
+# '''Whether every target column is in the header of an upload, only those uploads are read in the background'''
+def header_matches(content):
+    try:
+        return read_plan(tuple(pd.read_csv(io.BytesIO(content),nrows=0).columns))[0] is not None
+
+    except Exception:
+        return False            # the load right away reports what is wrong with the file
+
+
+# '''Loads and cleans a small upload right away'''
+def ingest_now(cache,content,content_key):
+    df = load_data(io.BytesIO(content))
+    if isinstance(df,str):
+        return df,None,None
+
+    ready_to_use_columns = fuzzy_matcher(df, TARGETS,THRESHOLD)
+    if isinstance(ready_to_use_columns,str):
+        return df,ready_to_use_columns,None              # nothing is cached when the columns don't match
+
+    genre_index = clean_upload(df,ready_to_use_columns)
+    cache_upload(cache,content_key,df,ready_to_use_columns,genre_index)
+    return df,ready_to_use_columns,genre_index
+
+
+# '''Starts the background read of an upload, unless another rerun or session already did'''
+def start_ingestion(cache,content,content_key):
+    with cache["lock"]:
+        if content_key in cache["jobs"]:
+            return cache["jobs"][content_key]
+
+        job = {"progress": 0.0,"rows": 0,"preview": None,"error": None,"done": False}
+        cache["jobs"][content_key] = job
+
+    threading.Thread(target=ingest_in_background,args=(cache,job,content,content_key),daemon=True).start()
+    return job
+
+
+# '''Reads an upload chunk by chunk outside the script run, so no streamlit call in here. The first chunk is cleaned and
+# published as a preview right away, the whole dataset is cleaned and put in the cache once every chunk is read'''
+def ingest_in_background(cache,job,content,content_key):
+    try:
+        buffer = io.BytesIO(content)
+        usecols,types = read_plan(tuple(pd.read_csv(buffer,nrows=0).columns))
+        rewind(buffer)
+        text = {col: kind for col,kind in types.items() if kind in ("string","category")}      # the numbers are inferred, a typed read can't be chunked
+
+        chunks = []
+        for chunk in pd.read_csv(buffer,usecols=usecols,dtype=text,chunksize=INGEST_CHUNK,float_precision="round_trip"):
+            chunks.append(chunk)
+            if job["preview"] is None:
+                preview = chunk.copy()
+                ready_to_use_columns = fuzzy_matcher(preview,TARGETS,THRESHOLD)
+                clean_string_columns(preview)
+                clean_dates(preview,ready_to_use_columns["Year"])
+                job["preview"] = (preview,ready_to_use_columns)
+
+            job["rows"] += len(chunk)
+            job["progress"] = min(buffer.tell() / len(content),1.0)
+
+        df = pd.concat(chunks,ignore_index=True)
+        del chunks
+        ready_to_use_columns = fuzzy_matcher(df,TARGETS,THRESHOLD)
+        cache_upload(cache,content_key,df,ready_to_use_columns,clean_upload(df,ready_to_use_columns))
+        with cache["lock"]:
+            cache["jobs"].pop(content_key,None)
+
+    except Exception as e:
+        job["error"] = f"Error in loading the data due to {e}"
+
+    finally:
+        job["done"] = True
+
+
+# '''Progress of a background read, looked at every PROGRESS_REFRESH seconds. Once it is done the whole app runs again with the full dataset'''
+@st.fragment(run_every=PROGRESS_REFRESH)
+def ingestion_progress(job):
+    if job["done"]:
+        st.rerun()
+
+    st.progress(job["progress"],text=f"Reading the upload in the background: {job['rows']} rows so far")
+
+
+
 # '''shows the basic info as a intro to the user about the dataset'''
 def show_basic_info(df,year):
     total_no_of_movies = len(df)
@@ -82,7 +282,6 @@ def show_basic_info(df,year):
 
 
 
-
 #Applies filter bsed on language,genre,country
 def filter(df,user_input,filterby):
     try:
@@ -94,6 +293,50 @@ def filter(df,user_input,filterby):
     
     
 
+# '''Genre x movie membership index: a bitset row per genre combination ("Fantasy, Thriller") and the combination code of every movie'''
+def build_genre_index(df,genre):
+    codes,combinations = pd.factorize(df[genre])
+    split = [[name.strip() for name in str(combination).split(",") if name.strip()] for combination in combinations]
+    genres = sorted({name for names in split for name in names})
+    position = {name: column for column,name in enumerate(genres)}
+
+    matrix = np.zeros((len(combinations) + 1,len(genres)),dtype=bool)      # the extra last row is all False, it's where the missing genres (code -1) land
+    for row,names in enumerate(split):
+        matrix[row,[position[name] for name in names]] = True
+
+    return {"codes": codes,"genres": genres,"position": position,"matrix": matrix}
+
+
+# '''Filters the movies having any (or all, with match_all) of the selected genres'''
+def filter_by_genres(df,genre_index,selected,match_all=False):
+    try:
+        columns = [genre_index["position"][name] for name in selected]
+        chosen = genre_index["matrix"][:,columns]
+        combination_matches = chosen.all(axis=1) if match_all else chosen.any(axis=1)     # decided once per combination, not per movie
+        return df[combination_matches[genre_index["codes"]]]
+
+    except Exception as e:
+        return f"Error in filtering by genres due to {e}"
+
+
+# '''Mean rating and number of movies of every single genre, a movie counts for each of its genres'''
+def genre_aggregates(df,genre_index,rating):
+    codes = genre_index["codes"]
+    combinations = len(genre_index["matrix"]) - 1
+    ratings = df[rating].to_numpy(dtype=float)
+    rated = (codes >= 0) & ~np.isnan(ratings)
+
+    rating_sums = np.bincount(codes[rated],weights=ratings[rated],minlength=combinations)
+    rating_counts = np.bincount(codes[rated],minlength=combinations)
+    movies = np.bincount(codes[codes >= 0],minlength=combinations)
+
+    matrix = genre_index["matrix"][:-1].astype(np.int64)
+    with np.errstate(invalid="ignore",divide="ignore"):
+        mean_rating = (rating_sums @ matrix) / (rating_counts @ matrix)
+
+    return pd.DataFrame({"mean_rating": mean_rating,"movies": movies @ matrix},index=pd.Index(genre_index["genres"],name="Genre"))
+
+
 # '''Filters the movies based on the given release date'''
 def filter_by_release_date(df,start,end,release_date):
     try:
@@ -110,8 +353,8 @@ def filter_by_release_date(df,start,end,release_date):
 # '''Shows insights based on the movie genre'''
 def genre_wise_analysis(df,genre,rating,release_date):
     try:
-        average_ratings_per_genre = df.groupby(genre)[rating].mean().sort_values(ascending=False)
-        most_frequent_genres = df.groupby(genre)[release_date].size().sort_values(ascending=False)
+        average_ratings_per_genre = analyze_group(df,grouping_column = genre,operated_column = rating,func_type = "mean_sort")
+        most_frequent_genres = analyze_group(df,grouping_column = genre,func_type = "size_sort")
 
         return average_ratings_per_genre,most_frequent_genres
 
@@ -121,15 +364,73 @@ def genre_wise_analysis(df,genre,rating,release_date):
 
 
 
+# '''The grouped result itself, without any streamlit call so it can also run in the background'''
+def group_result(df,grouping_column,operated_column,func_type):
+    if func_type == "mean_sort":
+        return df.groupby(grouping_column,observed=True)[operated_column].mean().sort_values(ascending=False)
+
+    return df.groupby(grouping_column,observed=True).size().sort_values(ascending=False)
+
+
+# '''The result cache of the current upload, a new one is started as soon as another file is uploaded'''
+def session_results():
+    dataset = st.session_state.file[1] if st.session_state.get("file") else None
+    results = st.session_state.get("results")
+    if results is None or results["dataset"] != dataset:
+        results = {"dataset": dataset,"entries": OrderedDict(),"lock": threading.Lock(),"precomputed": False}
+        st.session_state.results = results
+
+    return results
+
+
+# '''Which rows of the upload a frame holds, part of every result key so a filtered frame never gets the results of the whole upload'''
+def rows_key(df):
+    if isinstance(df.index,pd.RangeIndex):
+        return (df.index.start,df.index.stop,df.index.step)         # the whole upload, nothing to hash
+    return (len(df),hashlib.blake2b(pd.util.hash_array(df.index.to_numpy()).tobytes(),digest_size=16).hexdigest())
+
+
+# '''Looks the result up in the cache, computes and keeps it (LRU) when it isn't there'''
+def cached_result(results,key,compute):
+    with results["lock"]:
+        if key in results["entries"]:
+            results["entries"].move_to_end(key)
+            return results["entries"][key]
+
+    value = compute()
+    with results["lock"]:
+        results["entries"][key] = value
+        while len(results["entries"]) > RESULT_CACHE_MAX_ENTRIES:
+            results["entries"].popitem(last=False)
+
+    return value
+
+
+# '''Computes the standard year and genre summaries right after the upload, so the Analysis tab finds them ready'''
+def precompute_summaries(results,df,ready_to_use_columns,genre_index):
+    try:
+        year,rating = ready_to_use_columns["Year"],ready_to_use_columns["Rating"]
+        rows = rows_key(df)
+        cached_result(results,(rows,year,rating,"mean_sort"),lambda: group_result(df,year,rating,"mean_sort"))
+        cached_result(results,(rows,year,None,"size_sort"),lambda: group_result(df,year,None,"size_sort"))
+        if genre_index:
+            cached_result(results,(rows,"genre index",rating,"genre_aggregates"),lambda: genre_aggregates(df,genre_index,rating))
+
+    except Exception as e:
+        print(f"Error in precomputing the summaries due to {e}")
+
+
 def analyze_group(df,**columns):
     if all(key in columns for key in ["grouping_column","func_type"]) :   #we must mention full condition twice, if we do if "sth" and "other" in (...) then it will just check if sth which is a string and always true and that true is compare with  2nd condition
         if columns["func_type"] == "mean_sort":
-            mean_analyzed_data = df.groupby(columns["grouping_column"])[columns["operated_column"]].mean().sort_values(ascending=False)
+            key = (columns["grouping_column"],columns["operated_column"],"mean_sort")
+            mean_analyzed_data = cached_result(session_results(),(rows_key(df),) + key,lambda: group_result(df,*key))
             return mean_analyzed_data
         
         elif columns["func_type"] == "size_sort":
             st.write("WE are inside size sort")
-            size_analyzed_data =  df.groupby(columns["grouping_column"]).size().sort_values(ascending=False)
+            key = (columns["grouping_column"],None,"size_sort")        # the operated column doesn't change the sizes
+            size_analyzed_data =  cached_result(session_results(),(rows_key(df),) + key,lambda: group_result(df,*key))
             return size_analyzed_data
         
         else:
@@ -140,8 +441,8 @@ def analyze_group(df,**columns):
 # '''Shows insights based on the release year'''
 def year_wise_analysis(df,release_date,rating,movie):
     try:
-        average_rating_per_year = df.groupby(release_date)[rating].mean().sort_values(ascending=False)
-        total_movies_released_each_year = df.groupby(release_date)[movie].size().sort_values(ascending=False)
+        average_rating_per_year = analyze_group(df,grouping_column = release_date,operated_column = rating,func_type = "mean_sort")
+        total_movies_released_each_year = analyze_group(df,grouping_column = release_date,func_type = "size_sort")
 
         return average_rating_per_year,total_movies_released_each_year
 
@@ -149,9 +450,49 @@ def year_wise_analysis(df,release_date,rating,movie):
         return f"Error in year wise analysis due to {e}"
 
 
+# '''Row order of the whole dataset sorted by one column, computed once per uploaded file (and per preview of it) and column'''
+@st.cache_resource(max_entries=32)
+def sort_permutation(content_key,column,descending,_df):
+    codes,uniques = pd.factorize(_df[column],sort=True)
+    if descending:
+        codes = np.where(codes >= 0,len(uniques) - 1 - codes,codes)
+    codes = np.where(codes >= 0,codes,len(uniques))        # missing values always go last
+    return np.argsort(codes,kind="stable")
+
+
+# '''Shows one page of a result, only that page and the chosen columns are sent to the browser'''
+def show_paged(view,df,key):
+    if isinstance(view,str):
+        st.write(view)          # an error message from the filter
+        return
+
+    total = len(view)
+    columns = st.multiselect("Columns: ",list(df.columns),default=list(df.columns),key=f"{key}_columns")
+    sort_column = st.selectbox("Sort by: ",list(df.columns),index=None,key=f"{key}_sort")
+    descending = st.checkbox("Descending",key=f"{key}_descending")
+    pages = max(1,-(-total // PAGE_SIZE))
+    page = st.number_input(f"Page (of {pages}): ",min_value=1,max_value=pages,value=1,key=f"{key}_page")
+    start = (page - 1) * PAGE_SIZE
+
+    if sort_column:
+        order = sort_permutation((st.session_state.file[1],len(df)),sort_column,descending,df)
+        if total < len(df):
+            in_view = np.zeros(len(df),dtype=bool)
+            in_view[df.index.get_indexer(view.index)] = True
+            order = order[in_view[order]]          # the rows of the view, already in sorted order, no new sort needed
+
+        rows = df.iloc[order[start:start + PAGE_SIZE]]
+    else:
+        rows = view.iloc[start:start + PAGE_SIZE]
+
+    st.caption(f"Showing rows {min(start + 1,total)} - {min(start + PAGE_SIZE,total)} of {total}")
+    st.dataframe(rows[columns])
+
+
+
 #'''Display the data analysis using streamlit'''
 
-def apply_analysis(df,ready_to_use_columns):
+def apply_analysis(df,ready_to_use_columns,genre_index=None):
     analysis_choice = st.radio("How do you want to analyze the dataset?: ",["Year wise","Genre wise"],index=None)
 
     if (analysis_choice == "Year wise"):
@@ -174,16 +515,26 @@ def apply_analysis(df,ready_to_use_columns):
         if (st.session_state.branch_view == "genre_wise_analysis"):
 
             st.subheader("The Genre wise analysis is: ")
-            st.write("Average rating per genre: ")
-            st.write(analyze_group(df,grouping_column = ready_to_use_columns["Genre"], operated_column = ready_to_use_columns["Rating"] ,func_type = "mean_sort"))
+            if genre_index:
+                per_genre = cached_result(session_results(),(rows_key(df),"genre index",ready_to_use_columns["Rating"],"genre_aggregates"),
+                                          lambda: genre_aggregates(df,genre_index,ready_to_use_columns["Rating"]))
+                st.write("Average rating per genre: ")
+                st.write(per_genre["mean_rating"].sort_values(ascending=False))
+
+                st.write("Genre with highest no of movies: ")
+                st.write(per_genre["movies"].sort_values(ascending=False))
+
+            else:
+                st.write("Average rating per genre: ")
+                st.write(analyze_group(df,grouping_column = ready_to_use_columns["Genre"], operated_column = ready_to_use_columns["Rating"] ,func_type = "mean_sort"))
         
-            st.write("Genre with highest no of movies: ")
-            st.write(analyze_group(df,grouping_column = ready_to_use_columns["Genre"], operated_column = "messi",func_type = "size_sort"))
+                st.write("Genre with highest no of movies: ")
+                st.write(analyze_group(df,grouping_column = ready_to_use_columns["Genre"], operated_column = "messi",func_type = "size_sort"))
 
 
 
 #'''apply the filters to the data and show the filtered df using streamlit.'''
-def apply_filter(df,ready_to_use_columns):
+def apply_filter(df,ready_to_use_columns,genre_index=None):
 
     st.subheader("Filter Type: ")
     filter_choice = st.radio("Choose the filter: ",["Genre","Country","Language","Release Date"],index=None)
@@ -202,12 +553,19 @@ def apply_filter(df,ready_to_use_columns):
 
 
     if filter_choice:
-        if st.session_state.branch_view == "genre_filter":
+        if st.session_state.branch_view == "genre_filter" and genre_index:
+            genre_input = st.multiselect("Select the genres: ",genre_index["genres"])
+            match_all = st.radio("Movies having: ",["Any of them","All of them"],horizontal=True) == "All of them"
+            if genre_input:
+                st.write("The filtered dataset by genre is: ")
+                show_paged(filter_by_genres(df,genre_index,genre_input,match_all),df,"genre_filter")
+
+        elif st.session_state.branch_view == "genre_filter":
             genre_input = st.selectbox("Select the genre: ", df[ready_to_use_columns["Genre"]].unique(), index=None )     # we can pass not only list but bunch of other objects like - list, tuple, dictionary, numpyarray, etc.
             if genre_input:
                 if genre_input in df[ready_to_use_columns["Genre"]].values:
                     st.write("The filtered dataset by genre is: ")
-                    st.write(filter(df,genre_input,ready_to_use_columns["Genre"]))
+                    show_paged(filter(df,genre_input,ready_to_use_columns["Genre"]),df,"genre_filter")
 
     if filter_choice:
         if st.session_state.branch_view == "country_filter":
@@ -215,7 +573,7 @@ def apply_filter(df,ready_to_use_columns):
             if country_input:
                 if country_input in df[ready_to_use_columns["Country"]].values:
                     st.write("The filtered dataset by country is: ")
-                    st.write(filter(df,country_input,ready_to_use_columns["Country"]))
+                    show_paged(filter(df,country_input,ready_to_use_columns["Country"]),df,"country_filter")
 
 
     if filter_choice:
@@ -224,7 +582,7 @@ def apply_filter(df,ready_to_use_columns):
             if language_input:
                 if language_input in df[ready_to_use_columns["Language"]].values:
                     st.write("The filtered dataset by language is: ")
-                    st.write(filter(df,language_input,ready_to_use_columns["Language"]))
+                    show_paged(filter(df,language_input,ready_to_use_columns["Language"]),df,"language_filter")
 
     if filter_choice:
         if st.session_state.branch_view == "releasedate_filter":
@@ -232,6 +590,7 @@ def apply_filter(df,ready_to_use_columns):
             end_date = st.selectbox("Select the end date: ", df[ready_to_use_columns["Year"]].unique(),index=None)
             if (start_date and end_date in df[ready_to_use_columns["Year"]].unique()):
                 st.write("The filtered dataset by release date is: ")
+                show_paged(filter_by_release_date(df,start_date,end_date,ready_to_use_columns["Year"]),df,"releasedate_filter")
                
 
 
@@ -242,6 +601,7 @@ def main():
         "branch_view" : None,
         "file" : None,
         "df" : None,
+        "results" : None,
         
     }
 
@@ -256,11 +616,15 @@ def main():
 
     uploaded_file = st.file_uploader("Enter yout csv file: ")
 
+    loading = None
     if uploaded_file:
-        df = load_data(uploaded_file)
-        ready_to_use_columns = fuzzy_matcher(df, TARGETS,THRESHOLD)
-        clean_string_columns(df)
-        clean_dates(df,ready_to_use_columns["Year"])
+        df,ready_to_use_columns,genre_index,loading = ingest(uploaded_file)     # the cheap view logic below is all that runs again on a widget click
+        if loading:
+            ingestion_progress(loading)
+        results = session_results()
+        if not loading and not results["precomputed"] and isinstance(ready_to_use_columns,dict):
+            results["precomputed"] = True
+            threading.Thread(target=precompute_summaries,args=(results,df,ready_to_use_columns,genre_index),daemon=True).start()
         
         # st.write(df)
 
@@ -301,19 +665,26 @@ def main():
 
 
         
-        if (st.session_state.main_view == "basic info"):
+        if loading and st.session_state.main_view and (df is None or st.session_state.main_view in ("filter ds","analyze")):
+            st.info("The first rows are still being read" if df is None else "Filters and analysis are ready as soon as the whole file is read")
+
+        elif (st.session_state.main_view == "basic info"):
             st.subheader("The basic info of the given dataset is: ")
+            if loading:
+                st.caption(f"Only the first {len(df)} rows so far, the rest of the file is still being read")
             st.write(show_basic_info(df,ready_to_use_columns["Year"]))
 
         elif (st.session_state.main_view == "whole ds"):
             st.subheader("The whole dataset is: ")
-            st.write(df)
+            if loading:
+                st.caption(f"Only the first {len(df)} rows so far, the rest of the file is still being read")
+            show_paged(df,df,"whole_ds")
 
         elif (st.session_state.main_view == "filter ds"):
-            apply_filter(df,ready_to_use_columns)
+            apply_filter(df,ready_to_use_columns,genre_index)
 
         elif (st.session_state.main_view == "analyze"):
-            apply_analysis(df,ready_to_use_columns)
+            apply_analysis(df,ready_to_use_columns,genre_index)
 
 
     
@@ -324,6 +695,5 @@ if __name__ == "__main__":
 
 
 
-
     main()
     
@@ -0,0 +1,400 @@
+'''SHARED ANALYZER TOOLS'''
+
+# The helpers every analyzer script uses: tracing, file signatures and hashes, date inference, category cleaning,
+# downcasting, the aggregation engine, the report scheduler and the excel export.
+# The scripts live in their own folders and import this module from the folder above them.
+
+import os
+import sys
+import json
+import time
+import hashlib
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+try:
+    import resource
+except ImportError:          # not available on windows, the trace then has no peak memory
+    resource = None
+
+try:
+    import openpyxl
+except ImportError:          # only the excel export needs it, the movie app runs without it
+    openpyxl = None
+
+
+CATEGORY_MAX_RATIO = 0.5     # string columns with fewer distinct values than this share of the rows are kept as category
+CARDINALITY_SAMPLE = 10_000  # rows looked at before deciding between category and string
+DATE_FORMATS = ["%Y-%m-%d","%Y/%m/%d","%d/%m/%Y","%m/%d/%Y","%d-%m-%Y","%m-%d-%Y","%d.%m.%Y","%Y-%m-%d %H:%M:%S"]    # tried when pandas can't guess the format
+DATE_SAMPLE = 200            # rows tested when looking for the date format of a column
+DATE_GUESSES = 5             # first values of the sample pandas guesses a format from, one stray value doesn't hide the format
+DATE_MIN_SHARE = 0.9         # share of the sample a format has to parse, the few stray cells left become NaT
+DATE_PLAN_CACHE = ".date_plans.json"
+DATE_PLAN_VERSION = 2        # bump it whenever the inference changes, so the plans cached before are worked out again
+EXCEL_MAX_ROWS = 1_048_576   # rows an excel sheet can hold, title and header included
+EXPORT_BATCH = 10_000        # rows converted and streamed into a sheet at a time
+TRACE_FILE = os.environ.get("ANALYZER_TRACE")     # e.g. ANALYZER_TRACE=trace.jsonl to time every stage, unset to turn it off
+TRACE_RUN = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"     # tells the runs apart in a trace file shared by many runs
+TRACE_SCRIPT = os.path.splitext(os.path.basename(getattr(sys.modules["__main__"],"__file__","") or "interactive"))[0]
+TRACE_MEMORY = bool(os.environ.get("ANALYZER_TRACE_MEMORY"))     # also the peak memory each stage allocates, slower and blind to pyarrow's own pool
+TRACE_RECORDS = []
+TRACE_PEAKS = []             # peaks of the stages still running, a nested stage resets the peak its caller is measuring
+SCHEDULED_SECTIONS = []      # the sections of a process pool run, the forked workers inherit them instead of getting them pickled
+
+
+
+'''Peak resident memory of the process since it started in MB, it only ever grows from one stage to the next'''
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10),1)      # bytes on mac, kilobytes on linux
+
+
+
+'''Running one pipeline stage, timed and written to the trace when tracing is on and called as is otherwise'''
+def traced(stage,function,*args,**kwargs):
+    if not TRACE_FILE:
+        return function(*args,**kwargs)
+
+    if TRACE_MEMORY:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if TRACE_PEAKS:
+            TRACE_PEAKS[-1] = max(TRACE_PEAKS[-1],tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        TRACE_PEAKS.append(0)
+        before = tracemalloc.get_traced_memory()[0]
+
+    wall,cpu = time.perf_counter(),time.process_time()
+    result = function(*args,**kwargs)
+    record = {"run": TRACE_RUN,"script": TRACE_SCRIPT,"stage": stage,"wall_s": round(time.perf_counter() - wall,6),
+              "cpu_s": round(time.process_time() - cpu,6),"process_peak_rss_mb": peak_rss_mb()}
+
+    if TRACE_MEMORY:
+        peak = max(TRACE_PEAKS.pop(),tracemalloc.get_traced_memory()[1])
+        if TRACE_PEAKS:
+            TRACE_PEAKS[-1] = max(TRACE_PEAKS[-1],peak)
+        record["stage_peak_mb"] = round((peak - before) / 2**20,3)        # above what was in use when the stage started
+
+    frame = result if isinstance(result,pd.DataFrame) else next((arg for arg in args if isinstance(arg,pd.DataFrame)),None)
+    if frame is not None:         # the frame the stage made, or the one it worked on in place
+        record["rows"] = len(frame)
+        record["frame_mb"] = round(frame.memory_usage(deep=True).sum() / 2**20,3)
+
+    TRACE_RECORDS.append(record)
+    try:
+        with open(TRACE_FILE,"a") as trace:
+            trace.write(json.dumps(record) + "\n")
+    except Exception as e:
+        print(f"Error in writing the trace due to {e}")
+
+    return result
+
+
+
+'''Printing the stages of this run as a table'''
+def show_trace():
+    if not TRACE_RECORDS:
+        return
+    summary = pd.DataFrame(TRACE_RECORDS).drop(columns=["run","script"]).set_index("stage")
+    print(f"\nThe time and memory of every stage (trace written to {TRACE_FILE}): ")
+    print(summary.to_string())
+
+
+
+'''The signature of a file, it changes as soon as the file is modified'''
+def file_signature(file_name):
+    stat = os.stat(file_name)
+    return [stat.st_size,stat.st_mtime_ns]
+
+
+
+'''Hash of the file content, or of its first size bytes, read in blocks so big files don't need to fit in memory'''
+def content_hash(file_name,size=None):
+    digest = hashlib.blake2b(digest_size=16)
+    left = os.path.getsize(file_name) if size is None else size
+    with open(file_name,"rb") as source:
+        while left > 0:
+            block = source.read(min(1 << 20,left))
+            if not block:
+                break
+            digest.update(block)
+            left -= len(block)
+
+    return digest.hexdigest()
+
+
+
+'''Where the cleaned copy of a source file and its manifest are kept'''
+def cache_paths(file_name,cache_dir):
+    key = hashlib.blake2b(os.path.abspath(file_name).encode(),digest_size=8).hexdigest()
+    return os.path.join(cache_dir,f"{key}.parquet"),os.path.join(cache_dir,f"{key}.json")
+
+
+
+'''Finding the exact date format of a column by testing only a small sample of it, a format is taken when nearly all of
+the sample parses with it, so one stray cell doesn't make the whole column text'''
+def infer_date_format(series):
+    sample = series.head(DATE_SAMPLE).dropna()
+    if sample.empty or not isinstance(sample.iloc[0],str):
+        return None
+
+    guesses = [guess_datetime_format(value.strip()) for value in sample.head(DATE_GUESSES) if isinstance(value,str)]
+    for fmt in dict.fromkeys(guesses + DATE_FORMATS):
+        if fmt and "%d" in fmt and ("%Y" in fmt or "%y" in fmt):       # a full date, not just a month name like "november"
+            try:
+                if pd.to_datetime(sample,format=fmt,errors="coerce").notna().mean() >= DATE_MIN_SHARE:
+                    return fmt
+
+            except (ValueError,TypeError):
+                pass
+
+    return None
+
+
+
+'''Which columns are dates and in which format, cached by the file signature so the next runs skip the inference'''
+def date_plan(df,file_name=None):
+    cache = {}
+    if file_name:
+        path = os.path.abspath(file_name)
+        signature = file_signature(file_name)
+        try:
+            with open(DATE_PLAN_CACHE) as cache_file:
+                cache = json.load(cache_file)
+
+        except (FileNotFoundError,json.JSONDecodeError):
+            cache = {}
+
+        cached = cache.get(path,{})
+        if cached.get("signature") == signature and cached.get("version") == DATE_PLAN_VERSION:
+            return cached["plan"]
+
+    plan = {}
+    for col in df.select_dtypes(include=["object","string"]).columns:
+        fmt = infer_date_format(df[col])
+        if fmt:
+            plan[col] = fmt
+
+    if file_name:
+        cache[path] = {"signature": signature,"version": DATE_PLAN_VERSION,"plan": plan}
+        temporary = f"{DATE_PLAN_CACHE}.{os.getpid()}"
+        with open(temporary,"w") as cache_file:
+            json.dump(cache,cache_file,indent=2)
+        os.replace(temporary,DATE_PLAN_CACHE)        # the batch workers write it at the same time, a reader never sees half a file
+
+    return plan
+
+
+
+'''Measuring the cardinality of a column on a sample'''
+def is_low_cardinality(series,max_ratio=CATEGORY_MAX_RATIO):
+    sample = series.head(CARDINALITY_SAMPLE)
+    return len(sample) > 0 and sample.nunique() <= max_ratio * len(sample)
+
+
+
+'''Cleaning a category column by cleaning its distinct values only, not every row'''
+def clean_categories(series):
+    categories = series.cat.categories
+    if len(categories) == 0:
+        return series
+
+    cleaned_codes,cleaned = pd.factorize(categories.str.strip().str.title(),sort=True)     # "canada " and "Canada" become one category after cleaning
+    codes = series.cat.codes.to_numpy()
+    codes = np.where(codes >= 0,cleaned_codes[codes],-1)
+
+    return pd.Series(pd.Categorical.from_codes(codes,categories=cleaned.astype("string")),index=series.index,name=series.name)
+
+
+
+'''The smallest integer copy of a number column, scaled to fixed point first when a scale is given, None when that would lose any value'''
+def smallest_integer(series,scale=None):
+    if series.dtype.kind not in "iuf" or len(series) == 0 or series.isna().any():
+        return None
+
+    values = series.to_numpy()
+    if scale or values.dtype.kind == "f":
+        scaled = values.astype("float64") * (scale or 1)
+        whole = np.round(scaled)
+        if np.abs(whole - scaled).max() > (1e-6 if scale else 0):        # only float artifacts like 387.59999999999997 may be rounded away
+            return None
+        values = whole
+
+    for kind in (np.int8,np.int16,np.int32,np.int64):
+        limits = np.iinfo(kind)
+        if limits.min <= values.min() and values.max() <= limits.max:
+            converted = values.astype(kind)
+            return pd.Series(converted,index=series.index,name=series.name) if np.array_equal(converted,values) else None
+
+    return None
+
+
+
+'''Downcasting the number columns in place (the money ones to fixed point) and reporting their memory before and after,
+the columns the frame doesn't have are skipped'''
+def downcast_numbers(df,cols,money_cols=(),scale=None,verbose=False):
+    report = []
+    for col in [col for col in list(cols) + list(money_cols) if col in df.columns]:
+        before = df[col].memory_usage(index=False,deep=True)
+        old_type = df[col].dtype
+        converted = smallest_integer(df[col],scale if col in money_cols else None)
+        if converted is not None:
+            df[col] = converted
+        report.append({"column": col,"before": str(old_type),"after": str(df[col].dtype),
+                       "before_kb": round(before / 1024,1),"after_kb": round(df[col].memory_usage(index=False,deep=True) / 1024,1)})
+
+    if verbose:
+        report = pd.DataFrame(report).set_index("column")
+        print("\nThe memory of the number columns before and after downcasting: ")
+        print(report)
+        print(f"Saved {report['before_kb'].sum() - report['after_kb'].sum():.1f} KB")
+    return df
+
+
+
+'''The k biggest values in descending order by partial selection, only k=None sorts everything'''
+def top_k(data,k=None,by=None):
+    if k is None:
+        return data.sort_values(by=by,ascending=False) if by else data.sort_values(ascending=False)
+
+    return data.nlargest(k,by) if by else data.nlargest(k)
+
+
+
+'''Aggregation engine: runs many (keys, column, reducer) specs with one factorization per key and one pass over the rows'''
+def multi_aggregate(df,specs):
+    # reducers: "sum", "count", "mean", "min", "max" on a column, and "size" (column can be None)
+    keys = list(dict.fromkeys(key for spec_keys,_,_ in specs for key in spec_keys))
+
+    codes,uniques = {},{}
+    for key in keys:
+        codes[key],uniques[key] = pd.factorize(df[key],sort=True)     # sorted so the results come out in the same order as groupby
+        if isinstance(uniques[key].dtype,pd.CategoricalDtype):
+            uniques[key] = uniques[key].astype(uniques[key].dtype.categories.dtype)       # plain labels in the results, not a categorical index
+        if uniques[key].dtype.kind in "iu":
+            uniques[key] = uniques[key].astype(np.int64)          # downcast ids come out as the same int64 labels as before
+
+    group_ids = np.zeros(len(df),dtype=np.int64)
+    for key in keys:
+        group_ids = group_ids * (len(uniques[key]) + 1) + (codes[key] + 1)      # +1 because missing keys are coded -1
+        group_ids,_ = pd.factorize(group_ids)                                  # keeps the combined code small, it never overflows
+
+    needed = {"size": ("__size","size")}
+    for _,column,reducer in specs:
+        for part in (["sum","count"] if reducer == "mean" else [reducer]):
+            if part != "size":
+                needed[f"{column} {part}"] = (column,part)
+
+    rows = pd.DataFrame({f"__{key}": codes[key] for key in keys},index=df.index)
+    rows["__size"] = 0
+    for name,(column,_) in needed.items():
+        if column != "__size":
+            rows[column] = df[column]
+    for key in keys:
+        needed[f"__{key}"] = (f"__{key}","first")
+
+    finest = rows.groupby(group_ids,sort=False).agg(**needed)     # the only pass over the rows, every view below is rolled up from here
+
+    results = []
+    for spec_keys,column,reducer in specs:
+        code_cols = [f"__{key}" for key in spec_keys]
+        groups = finest[(finest[code_cols] >= 0).all(axis=1)].groupby(code_cols,sort=True)
+
+        if reducer == "size":
+            result = groups["size"].sum()
+        elif reducer == "mean":
+            result = groups[f"{column} sum"].sum() / groups[f"{column} count"].sum()
+        elif reducer in ("min","max"):
+            result = groups[f"{column} {reducer}"].agg(reducer)
+        else:
+            result = groups[f"{column} {reducer}"].sum()
+            if result.dtype.kind in "iu":
+                result = result.astype(np.int64)       # downcast columns sum to the same int64 totals as before
+
+        labels = [uniques[key].take(result.index.get_level_values(level)) for level,key in enumerate(spec_keys)]
+        result.index = pd.Index(labels[0],name=spec_keys[0]) if len(spec_keys) == 1 else pd.MultiIndex.from_arrays(labels,names=spec_keys)
+        results.append(result.rename(column))
+
+    return results
+
+
+
+'''Running one scheduled section in a forked worker, by its position so only the result is sent back'''
+def run_scheduled(number):
+    stage,function,args = SCHEDULED_SECTIONS[number]
+    return traced(stage,function,*args)
+
+
+
+'''Report scheduler: independent read only sections (stage, function, args) run concurrently and the results come back
+in the order they were given. Threads read the same frame, forked processes get it copy on write. None workers uses
+every core, 1 runs the sections one after another, and the process pool falls back to threads where fork isn't available'''
+def run_sections(sections,workers=None,pool="thread"):
+    workers = min(workers or os.cpu_count() or 1,len(sections))
+    forking = pool == "process" and "fork" in multiprocessing.get_all_start_methods()
+    if workers <= 1 or (TRACE_MEMORY and not forking):       # threads share the traced memory, their stage peaks couldn't be told apart
+        return [traced(stage,function,*args) for stage,function,args in sections]
+
+    if forking:
+        SCHEDULED_SECTIONS[:] = sections
+        try:
+            with ProcessPoolExecutor(max_workers=workers,mp_context=multiprocessing.get_context("fork")) as executor:
+                return list(executor.map(run_scheduled,range(len(sections))))
+        finally:
+            SCHEDULED_SECTIONS.clear()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(traced,stage,function,*args) for stage,function,args in sections]
+        return [future.result() for future in futures]
+
+
+
+'''Writing frames to an excel workbook, one sheet each, in openpyxl's write only mode so the rows are streamed batch by batch
+and memory stays flat. Sheets too long for excel go to a csv or parquet file next to it instead'''
+def export_frames(file_name,sheets,titles=None,index=False,fallback="csv"):
+    titles = titles or {}
+    stem = os.path.splitext(file_name)[0]
+    if openpyxl is None:
+        raise ImportError(f"openpyxl is needed to write {file_name}")
+    workbook = openpyxl.Workbook(write_only=True)
+    written = []
+
+    for name,frame in sheets.items():
+        frame = frame.to_frame() if isinstance(frame,pd.Series) else frame
+        frame = frame.reset_index() if index else frame
+        frame = frame.astype({col: str for col in frame.columns if isinstance(frame[col].dtype,pd.PeriodDtype)})    # excel has no period type, months go in as text
+        title = titles.get(name)
+
+        if len(frame) + 1 + (title is not None) > EXCEL_MAX_ROWS:
+            path = f"{stem}_{name}.{fallback}"
+            if fallback == "parquet":
+                frame.to_parquet(path,index=False)
+            else:
+                with open(path,"w",newline="") as out:
+                    if title is not None:
+                        out.write(title + "\n")
+                    frame.to_csv(out,index=False)
+            print(f"{name} has {len(frame)} rows, too many for excel, written to {path}")
+            written.append(path)
+            continue
+
+        worksheet = workbook.create_sheet(title=name[:31])
+        if title is not None:
+            worksheet.append([title])
+        worksheet.append([str(col) for col in frame.columns])
+        for start in range(0,len(frame),EXPORT_BATCH):
+            block = frame.iloc[start:start + EXPORT_BATCH].astype(object)
+            block = block.where(block.notna(),None)          # empty cells rather than nan
+            for row in block.itertuples(index=False,name=None):
+                worksheet.append(row)
+
+    if workbook.worksheets:
+        workbook.save(file_name)
+        written.insert(0,file_name)
+    return written
@@ -0,0 +1,239 @@
+'''BENCHMARK SUITE'''
+
+# Times every stage of the analyzers on synthetic data of several sizes and writes a json report.
+#   python benchmarks/benchmark.py --sizes 1000 100000 10000000 --output report.json
+#   python benchmarks/benchmark.py --compare old_report.json        (compares against an earlier run)
+
+import os
+import io
+import sys
+import json
+import time
+import runpy
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+import importlib.util
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import synthetic_data
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ANALYZERS = {
+    "sales": os.path.join(ROOT,"Project 3","project3REVISED.py"),
+    "orders": os.path.join(ROOT,"Project 4","project4.py"),
+    "movies": os.path.join(ROOT,"Project_5","project5.py"),
+    "weather": os.path.join(ROOT,"Project 2","project2.py"),
+    "grades": os.path.join(ROOT,"Project 1","project1.py"),
+}
+
+DEFAULT_SIZES = [1_000,10_000,100_000]
+CHUNK_SIZE = 250_000         # chunk size used for the streaming stage of the sales analyzer
+
+
+
+'''Imports an analyzer from its file, the project folders aren't packages'''
+def load_module(name,path):
+    spec = importlib.util.spec_from_file_location(f"bench_{name}",path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+'''Stages of the sales analyzer (Project 3), each one gets the output of the previous one'''
+def sales_stages(module,file_name):
+    schema = lambda df: module.schema_of(df)
+    return [
+        ("load_data",lambda _: module.load_data(file_name)),
+        ("to_date_time",lambda df: module.to_date_time(df,verbose=False)),
+        ("uniform_string_values",lambda df: module.uniform_string_values(df)),
+        ("enforce_data_type",lambda df: module.enforce_data_type(df,module.STRING_COLS,module.INTEGER_COLS)),
+        ("totals",lambda df: (module.totals(df,module.INTEGER_COLS,schema(df)),df)[1]),
+        ("profit",lambda df: (module.profit(df,schema(df)),df)[1]),
+        ("average_order_quantity",lambda df: (module.average_order_quantity(df,schema(df)),df)[1]),
+        ("sales_by_region",lambda df: (module.sales_by_region(df,schema(df)),df)[1]),
+        ("sales_by_personal_traits",lambda df: (module.sales_by_personal_traits(df,schema(df)),df)[1]),
+        ("stream_analysis",lambda df: (module.stream_analysis(file_name,CHUNK_SIZE),df)[1]),
+    ]
+
+
+'''Stages of the top customer analyzer (Project 4)'''
+def orders_stages(module,file_name):
+    schema = lambda df: module.resolve_schema(tuple(df.columns))
+    return [
+        ("load_data",lambda _: module.load_data(file_name)),
+        ("to_date_time",lambda df: module.to_date_time(df)),
+        ("clean_text",lambda df: module.clean_text(df)),
+        ("build_filter_index",lambda df: (module.build_filter_index(df,schema(df)),df)[1]),
+        ("top_customers",lambda df: (module.top_customers(df,schema(df)),df)[1]),
+        ("build_cube",lambda df: (module.build_cube(df,schema(df)),df)[1]),
+        ("behavioural_analysis",lambda df: (module.behavioural_analysis(df,schema(df)),df)[1]),
+    ]
+
+
+'''Stages of the movie rating analyzer (Project 5), without the streamlit views'''
+def movies_stages(module,file_name):
+    return [
+        ("load_data",lambda _: module.load_data(file_name)),
+        ("fuzzy_matcher",lambda df: (module.fuzzy_matcher(df,module.TARGETS,module.THRESHOLD),df)[1]),
+        ("clean_string_columns",lambda df: module.clean_string_columns(df)),
+        ("build_genre_index",lambda df: (module.build_genre_index(df,"Genre"),df)[1]),
+        ("genre_aggregates",lambda df: (module.genre_aggregates(df,module.build_genre_index(df,"Genre"),"Rating"),df)[1]),
+        ("group_result",lambda df: (module.group_result(df,"Year","Rating","mean_sort"),df)[1]),
+    ]
+
+
+'''Stages of the grade report engine (Project 1)'''
+def grades_stages(module,file_name):
+    return [
+        ("load_scores",lambda _: module.load_scores(file_name)),
+        ("grade_report",lambda df: (module.grade_report(df),df)[1]),
+    ]
+
+
+'''The weather analyzer (Project 2) is a plain script, it is timed as a whole in the folder of the generated file'''
+def weather_stages(path,file_name):
+    def run_script(_):
+        previous = os.getcwd()
+        os.chdir(os.path.dirname(file_name))
+        try:
+            runpy.run_path(path,run_name="__main__")
+        finally:
+            os.chdir(previous)
+
+    return [("script",run_script)]
+
+
+STAGES = {"sales": sales_stages,"orders": orders_stages,"movies": movies_stages,"grades": grades_stages}
+
+
+
+'''Runs one stage `repeat` times on a fresh copy of its input and keeps the fastest time'''
+def time_stage(function,data,repeat):
+    best = None
+    for _ in range(repeat):
+        given = data.copy(deep=True) if isinstance(data,pd.DataFrame) else data
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):        # the analyzers print a lot, it isn't part of the timing
+            output = function(given)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best,elapsed)
+    return best,output
+
+
+'''Benchmarks one schema at one size, returns one result row per stage'''
+def run_schema(schema,rows,repeat,seed,workdir):
+    folder = os.path.join(workdir,f"{schema}_{rows}")
+    os.makedirs(folder,exist_ok=True)
+    file_name = os.path.join(folder,"weather_data.csv" if schema == "weather" else f"{schema}.csv")
+
+    start = time.perf_counter()
+    synthetic_data.write_csv(schema,rows,file_name,seed)
+    results = [{"schema": schema,"rows": rows,"stage": "generate","seconds": time.perf_counter() - start,"repeats": 1}]
+
+    try:
+        if schema == "weather":
+            stages = weather_stages(ANALYZERS[schema],file_name)
+        else:
+            stages = STAGES[schema](load_module(schema,ANALYZERS[schema]),file_name)
+
+    except Exception as e:
+        print(f"Skipping {schema}: {e}")
+        results.append({"schema": schema,"rows": rows,"stage": "import","error": str(e)})
+        return results
+
+    data = None
+    for stage,function in stages:
+        try:
+            seconds,data = time_stage(function,data,repeat)
+            results.append({"schema": schema,"rows": rows,"stage": stage,"seconds": seconds,"repeats": repeat})
+        except Exception as e:
+            results.append({"schema": schema,"rows": rows,"stage": stage,"error": str(e)})
+            break
+
+    return results
+
+
+
+'''Versions and commit of the benchmarked tree, so reports of different versions can be told apart'''
+def environment():
+    try:
+        commit = subprocess.run(["git","rev-parse","HEAD"],cwd=ROOT,capture_output=True,text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {"created": datetime.now(timezone.utc).isoformat(),"commit": commit,"python": platform.python_version(),
+            "pandas": pd.__version__,"numpy": np.__version__,"machine": platform.machine(),"cpus": os.cpu_count()}
+
+
+'''Printing the results as a table, with the change against an earlier report when there is one'''
+def show_summary(results,baseline=None):
+    table = pd.DataFrame([result for result in results if "seconds" in result])
+    if table.empty:
+        print("No results")
+        return
+
+    table["rows_per_second"] = table["rows"] / table["seconds"]
+    if baseline:
+        old = pd.DataFrame([result for result in baseline["results"] if "seconds" in result])
+        old = old.set_index(["schema","rows","stage"])["seconds"].rename("baseline_seconds")
+        table = table.join(old,on=["schema","rows","stage"])
+        table["speedup"] = table["baseline_seconds"] / table["seconds"]
+
+    with pd.option_context("display.max_rows",None,"display.width",200):
+        print(table.drop(columns="repeats").to_string(index=False,float_format=lambda value: f"{value:.4g}"))
+
+    for result in results:
+        if "error" in result:
+            print(f"FAILED {result['schema']} {result['rows']} {result['stage']}: {result['error']}")
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analyzers on synthetic data")
+    parser.add_argument("--sizes",type=int,nargs="+",default=DEFAULT_SIZES,help="row counts to benchmark")
+    parser.add_argument("--schemas",nargs="+",default=synthetic_data.SCHEMAS,choices=synthetic_data.SCHEMAS)
+    parser.add_argument("--repeat",type=int,default=3,help="runs of every stage, the fastest one is kept")
+    parser.add_argument("--seed",type=int,default=0)
+    parser.add_argument("--output",default="benchmark_report.json")
+    parser.add_argument("--compare",help="an earlier report to compare against")
+    parser.add_argument("--workdir",help="where the generated files go, a temporary folder by default")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as report_file:
+            baseline = json.load(report_file)
+
+    results = []
+    with tempfile.TemporaryDirectory() as temporary:
+        workdir = args.workdir or temporary
+        previous = os.getcwd()
+        os.chdir(workdir)            # the analyzers' own cache files end up here and not in the repo
+        try:
+            for rows in args.sizes:
+                for schema in args.schemas:
+                    print(f"Benchmarking {schema} with {rows} rows")
+                    results.extend(run_schema(schema,rows,args.repeat,args.seed,workdir))
+        finally:
+            os.chdir(previous)
+
+    report = {"environment": environment(),"sizes": args.sizes,"repeat": args.repeat,"seed": args.seed,"results": results}
+    with open(args.output,"w") as report_file:
+        json.dump(report,report_file,indent=2)
+
+    show_summary(results,baseline)
+    print(f"\nReport written to {args.output}")
+
+
+
+if __name__ == "__main__":
+    sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+    main()
@@ -0,0 +1,152 @@
+'''MISSING VALUES CHECK'''
+
+# Runs the analyzers on synthetic files with blank cells in their text and date columns, and a stray cell that isn't a
+# date, and checks that the blanks stay missing values (never the text "None"), that the dates are still parsed, and
+# that the reports built from the gappy files don't fail.
+#   python benchmarks/check_gaps.py                    (every analyzer this python can load)
+#   python benchmarks/check_gaps.py --schemas movies   (the movie app needs the python streamlit runs on)
+
+import os
+import io
+import sys
+import argparse
+import tempfile
+import contextlib
+
+import pandas as pd
+
+import synthetic_data
+from benchmark import ANALYZERS, load_module
+from check_incremental import compare
+
+
+ROWS = 3_000
+GAPS = {"sales": {"Date": [5,150,2400],"Country": [7,900]},
+        "orders": {"Order_Date": [3,120,2500],"Customer_Name": [8,1700]},
+        "movies": {"Genre": [4,60,2200],"Title": [9,1300]}}      # the rows blanked in every column, some inside the first 200 rows
+STRAYS = {"sales": {"Date": {2: "not recorded"}},"orders": {"Order_Date": {40: "unknown"}},"movies": {}}     # cells that aren't a date in a date column
+
+
+
+'''A synthetic file of a schema with the GAPS cells left blank and the STRAYS cells overwritten'''
+def gappy_file(schema,file_name):
+    synthetic_data.write_csv(schema,ROWS,file_name)
+    df = pd.read_csv(file_name,dtype=str,keep_default_na=False)
+    for col,rows in GAPS[schema].items():
+        df.loc[rows,col] = ""
+    for col,values in STRAYS[schema].items():
+        df.loc[list(values),col] = list(values.values())
+    df.to_csv(file_name,index=False)
+    return file_name
+
+
+'''The problems of the text columns of a frame: a blank cell read as "None", or not as many missing values as blanks'''
+def gap_problems(df,columns):
+    problems = []
+    for col,rows in columns.items():
+        values = df[col].astype(object)
+        if (values == "None").any():
+            problems.append(f"{col}: blank cells were read as the text 'None'")
+        if values.isna().sum() != len(rows):
+            problems.append(f"{col}: {values.isna().sum()} missing values instead of {len(rows)}")
+    return problems
+
+
+'''Sales (Project 3): dates parsed despite the gaps and a stray cell, and the streamed time range equal to the in-memory one'''
+def check_sales(module,file_name):
+    df = module.load_clean_data(file_name)
+    problems = gap_problems(df,{"Country": GAPS["sales"]["Country"]})
+    if not pd.api.types.is_datetime64_any_dtype(df["Date"]):
+        return problems + [f"Date was left as {df['Date'].dtype}, not parsed"]
+    missing = len(GAPS["sales"]["Date"]) + len(STRAYS["sales"]["Date"])
+    if df["Date"].isna().sum() != missing:
+        problems.append(f"Date: {df['Date'].isna().sum()} missing values instead of {missing}")
+
+    start,end = pd.Timestamp("2014-01-01"),pd.Timestamp("2015-06-30")
+    ranged = module.insights_within_time_constraints(df,start,end)
+    schema = module.schema_of(ranged)
+    expected = (module.totals(ranged,module.INTEGER_COLS,schema),module.profit(ranged,schema),module.average_order_quantity(ranged,schema),
+                module.sales_by_region(ranged,schema),module.sales_by_personal_traits(ranged,schema))
+    streamed = module.stream_analysis(file_name,ROWS // 4,start,end)
+    return problems + (compare(expected,streamed) if streamed else ["the streamed time range gave no reports"])
+
+
+'''Orders (Project 4): dates parsed despite the gaps and a stray cell, the behaviour reports built and the undated orders still counted as visits'''
+def check_orders(module,file_name):
+    df = module.load_clean_data(file_name)
+    problems = gap_problems(df,{"Customer_Name": GAPS["orders"]["Customer_Name"]})
+    if not pd.api.types.is_datetime64_any_dtype(df["Order_Date"]):
+        return problems + [f"Order_Date was left as {df['Order_Date'].dtype}, not parsed"]
+
+    reports = module.behaviour_reports(df,module.resolve_schema(tuple(df.columns)))
+    if isinstance(reports,str):
+        return problems + [f"behaviour reports: {reports}"]
+
+    visits = df.groupby("Customer_ID").size()
+    expected = visits[visits > 1].to_dict()
+    repeated = reports[0][4]
+    if dict(zip(repeated["Customer_ID"],repeated["No of visits"])) != expected:
+        problems.append("the repeated customers don't count every order of the customer")
+    return problems
+
+
+'''Movies (Project 5): the upload read at once and the one read in the background give the same cleaned frame'''
+def check_movies(module,file_name):
+    with open(file_name,"rb") as source:
+        content = source.read()
+
+    cache = {"entries": {},"jobs": {},"lock": module.threading.Lock()}
+    module.ingest_now(cache,content,"now")
+    job = {"progress": 0.0,"rows": 0,"preview": None,"error": None,"done": False}
+    module.ingest_in_background(cache,job,content,"background")
+    if job["error"]:
+        return [job["error"]]
+
+    (eager,_,eager_index,_),(background,_,_,_) = cache["entries"]["now"],cache["entries"]["background"]
+    problems = gap_problems(eager,GAPS["movies"])
+    if "None" in eager_index["genres"]:
+        problems.append("a 'None' genre was made out of the blank genres")
+    try:
+        pd.testing.assert_frame_equal(eager,background)
+    except AssertionError as e:
+        problems.append(f"the two reads differ, {str(e).splitlines()[0]}")
+    return problems
+
+
+CHECKS = {"sales": check_sales,"orders": check_orders,"movies": check_movies}
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the analyzers on files with blank cells")
+    parser.add_argument("--schemas",nargs="+",choices=list(CHECKS),default=list(CHECKS))
+    args = parser.parse_args()
+
+    failed = False
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)            # the caches and the date plans end up here and not in the repo
+        try:
+            for schema in args.schemas:
+                try:
+                    module = load_module(schema,ANALYZERS[schema])
+                except (SyntaxError,ImportError) as e:
+                    print(f"{schema}: SKIPPED, the analyzer can't be loaded by this python ({e.__class__.__name__}: {e})")
+                    continue
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    problems = CHECKS[schema](module,gappy_file(schema,os.path.join(workdir,f"{schema}.csv")))
+                for problem in problems:
+                    print(f"{schema}: {problem}")
+                print(f"{schema}: FAILED" if problems else f"{schema}: the gaps stay missing and the reports are built")
+                failed = failed or bool(problems)
+        finally:
+            os.chdir(previous)
+
+    return 1 if failed else 0
+
+
+
+if __name__ == "__main__":
+    sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
@@ -0,0 +1,100 @@
+'''INCREMENTAL REFRESH CHECK'''
+
+# Runs the incremental refresh of the sales analyzer (Project 3) on a file written in pieces, a row cut in half
+# included, and checks that the reports equal the ones of the full in-memory run on the same file.
+#   python benchmarks/check_incremental.py                        (the bundled mini_sales_data.csv)
+#   python benchmarks/check_incremental.py --file big_sales.csv --pieces 5
+
+import os
+import io
+import sys
+import argparse
+import tempfile
+import contextlib
+
+import pandas as pd
+
+from benchmark import ANALYZERS, load_module
+
+
+DEFAULT_FILE = os.path.join(os.path.dirname(ANALYZERS["sales"]),"mini_sales_data.csv")
+
+
+
+'''The reports of the full run, the same calls as the analyzer's main'''
+def full_reports(module,file_name):
+    df = module.load_clean_data(file_name)
+    schema = module.schema_of(df)
+    return (module.totals(df,module.INTEGER_COLS,schema),module.profit(df,schema),module.average_order_quantity(df,schema),
+            module.sales_by_region(df,schema),module.sales_by_personal_traits(df,schema))
+
+
+'''Every report as a flat list, the region and traits reports are tuples themselves'''
+def flatten(reports):
+    return [part for report in reports for part in (report if isinstance(report,tuple) else (report,))]
+
+
+'''The differences between two sets of reports, an empty list when they are the same'''
+def compare(expected,actual):
+    differences = []
+    for number,(left,right) in enumerate(zip(flatten(expected),flatten(actual))):
+        try:
+            if isinstance(left,pd.Series):
+                pd.testing.assert_series_equal(left,right)
+            elif left != right:
+                differences.append(f"report {number}: {left} != {right}")
+        except AssertionError as e:
+            differences.append(f"report {number}: {e}")
+    return differences
+
+
+'''Writes the file in pieces (the first cut in the middle of a row) and runs the refresh after each one, then once more
+with nothing new so the unfinished last line of the file is counted too'''
+def incremental_reports(module,file_name,pieces):
+    with open(file_name,"rb") as source:
+        content = source.read()
+
+    copy = os.path.join(os.getcwd(),"incremental.csv")
+    cuts = [len(content) * number // pieces for number in range(1,pieces)] + [len(content)]
+    written = 0
+    open(copy,"wb").close()
+    for cut in cuts:
+        with open(copy,"ab") as target:
+            target.write(content[written:cut])
+        written = cut
+        module.incremental_analysis(copy)
+
+    return module.incremental_analysis(copy)
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the incremental refresh against the full run")
+    parser.add_argument("--file",default=DEFAULT_FILE)
+    parser.add_argument("--pieces",type=int,default=3,help="parts the file is appended in")
+    args = parser.parse_args()
+    file_name = os.path.abspath(args.file)
+
+    module = load_module("sales",ANALYZERS["sales"])
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)            # the caches and the incremental state end up here and not in the repo
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = full_reports(module,file_name)
+                module.SETTLE_SECONDS = 3600         # a file written a moment ago is still growing, its cut row has to wait
+                actual = incremental_reports(module,file_name,args.pieces)
+        finally:
+            os.chdir(previous)
+
+    differences = compare(expected,actual) if actual else ["the incremental refresh gave no reports"]
+    for difference in differences:
+        print(difference)
+    print("FAILED" if differences else "The incremental and the full reports are the same")
+    return 1 if differences else 0
+
+
+
+if __name__ == "__main__":
+    sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
@@ -0,0 +1,232 @@
+'''SYNTHETIC DATA GENERATOR'''
+
+# Deterministic fake datasets shaped like the ones each analyzer reads, from a few rows up to 10^7.
+# Every schema is built block by block, so big files never have to fit in memory at once.
+
+import numpy as np
+import pandas as pd
+
+
+BLOCK_ROWS = 1_000_000       # rows generated and written at a time
+DIRTY_SHARE = 0.2            # share of the string values with wrong case or extra spaces, like the real exports
+
+COUNTRIES = ["United States","Canada","Australia","Germany","France","United Kingdom"]
+STATES = ["California","Washington","Oregon","British Columbia","Ontario","New South Wales","Victoria","Queensland",
+          "Bayern","Hessen","Saarland","Nord","Yveline","England","Texas","New York","Florida","Georgia",
+          "Minnesota","North Carolina","South Carolina","Ohio","Alberta","Quebec"]
+AGE_GROUPS = ["Youth (<25)","Young Adults (25-34)","Adults (35-64)","Seniors (64+)"]
+GENDERS = ["M","F"]
+MONTHS = ["January","February","March","April","May","June","July","August","September","October","November","December"]
+CATEGORIES = {"Accessories": ["Bike Racks","Bottles and Cages","Tires and Tubes","Helmets","Fenders"],
+              "Clothing": ["Jerseys","Caps","Gloves","Shorts","Vests"],
+              "Bikes": ["Road Bikes","Mountain Bikes","Touring Bikes"],
+              "Books": ["Biography","Comics","Fiction"],
+              "Toys": ["Board Game","Puzzle","Action Figure"],
+              "Home & Kitchen": ["Mixer","Blender","Toaster"]}
+FIRST_NAMES = ["James","Mary","Robert","Patricia","John","Jennifer","Michael","Linda","David","Elizabeth","William","Barbara",
+               "Richard","Susan","Joseph","Jessica","Thomas","Sarah","Charles","Karen","Daniel","Lisa","Matthew","Nancy"]
+LAST_NAMES = ["Smith","Johnson","Williams","Brown","Jones","Garcia","Miller","Davis","Rodriguez","Martinez","Hernandez",
+              "Lopez","Gonzalez","Wilson","Anderson","Thomas","Taylor","Moore","Jackson","Martin","Lee","Perez","Thompson"]
+GENRES = ["Action","Adventure","Comedy","Drama","Fantasy","Horror","Romance","Sci-Fi","Thriller","Animation","Crime","Mystery"]
+TITLES = ["Parasite","The Lion King","The Dark Knight","Forrest Gump","Toy Story","Inception","Spirited Away","Amelie",
+          "Alien","Up","Heat","Rocky","Psycho","Vertigo","Casablanca","Jaws"]
+LANGUAGES = ["English","Spanish","French","Korean","Hindi","Japanese"]
+REVIEWS = ["Didn't live up to the Hype.","Best movie I've seen in years.","Amazing story and direction.",
+           "Just average, nothing special.","Beautiful cinematography and music.","Too long for my taste."]
+STATIONS = ["Kathmandu","Pokhara","Biratnagar","Nepalgunj","Dhangadhi","Janakpur","Bharatpur","Butwal"]
+SUBJECTS = ["Math","Science","English","Nepali","Social"]
+CLASS_SIZES = 20 + np.arange(21) * 8 % 21       # every size from 20 to 40 once, shuffled, then the cycle repeats
+
+
+
+'''Every clean value together with a few dirty spellings of it'''
+def dirty_variants(values):
+    variants = []
+    for value in values:
+        variants.append([value,value.lower(),value.upper(),f"  {value} ",f"{value.lower()} "])
+    return np.array(variants,dtype=object)
+
+
+'''Picks a value per row from a pool, dirtied for a share of the rows, without any per-row string work'''
+def pick_strings(rng,values,size,dirty=True,probabilities=None):
+    chosen = rng.choice(len(values),size=size,p=probabilities)
+    if not dirty:
+        return np.asarray(values,dtype=object)[chosen]
+
+    variant = np.where(rng.random(size) < DIRTY_SHARE,rng.integers(1,5,size),0)
+    return dirty_variants(values)[chosen,variant]
+
+
+'''A calendar of days and the day picked for every row, so the dates are formatted once per day and not once per row'''
+def pick_dates(rng,size,start="2013-01-01",days=365 * 4):
+    offsets = rng.integers(0,days,size)
+    calendar = pd.date_range(start,periods=days,freq="D")
+    return calendar,offsets
+
+
+'''Zipf-like weights, a few values are very common and the rest are rare'''
+def skewed(count):
+    weights = 1.0 / np.arange(1,count + 1)
+    return weights / weights.sum()
+
+
+'''Product names of every sub category'''
+def product_catalog(per_sub_category=10):
+    products = []
+    for category,sub_categories in CATEGORIES.items():
+        for sub_category in sub_categories:
+            for number in range(per_sub_category):
+                products.append((category,sub_category,f"{sub_category} {number}"))
+    return products
+
+
+
+'''Sales rows shaped like mini_sales_data.csv (Project 3)'''
+def sales_block(rng,size):
+    calendar,offsets = pick_dates(rng,size)
+    dates = calendar[offsets]
+    catalog = product_catalog()
+    product = rng.choice(len(catalog),size=size,p=skewed(len(catalog)))
+    quantity = rng.integers(1,33,size)
+    unit_cost = rng.integers(2,1500,len(catalog))[product]
+    unit_price = unit_cost + rng.integers(1,900,len(catalog))[product]
+    age = rng.integers(17,88,size)
+
+    return pd.DataFrame({
+        "Date": calendar.strftime("%Y-%m-%d").to_numpy()[offsets],
+        "Day": dates.day,
+        "Month": np.array([month.lower() for month in MONTHS],dtype=object)[dates.month - 1],
+        "Year": dates.year,
+        "Customer_Age": age,
+        "Age_Group": np.array(AGE_GROUPS,dtype=object)[np.digitize(age,[25,35,65])],
+        "Customer_Gender": pick_strings(rng,GENDERS,size,dirty=False),
+        "Country": pick_strings(rng,COUNTRIES,size,probabilities=skewed(len(COUNTRIES))),
+        "State": pick_strings(rng,STATES,size),
+        "Product_Category": np.array([item[0] for item in catalog],dtype=object)[product],
+        "Sub_Category": np.array([item[1] for item in catalog],dtype=object)[product],
+        "Product": dirty_variants([item[2] for item in catalog])[product,np.where(rng.random(size) < DIRTY_SHARE,rng.integers(1,5,size),0)],
+        "Order_Quantity": quantity,
+        "Unit_Cost": unit_cost,
+        "Unit_Price": unit_price,
+        "Profit": quantity * (unit_price - unit_cost),
+        "Cost": quantity * unit_cost,
+        "Revenue": quantity * unit_price,
+    })
+
+
+'''Customer orders shaped like for_project4.csv (Project 4), about one customer per ten orders'''
+def orders_block(rng,size,customers):
+    customer = rng.choice(customers,size=size,p=skewed(customers))
+    first = np.array(FIRST_NAMES,dtype=object)[customer % len(FIRST_NAMES)]
+    last = np.array(LAST_NAMES,dtype=object)[(customer // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    calendar,offsets = pick_dates(rng,size,start="2023-01-01",days=540)
+    catalog = product_catalog()
+    product = rng.choice(len(catalog),size=size)
+    quantity = rng.integers(1,11,size)
+    unit_cost = np.round(rng.uniform(5,80,len(catalog)),2)[product]
+    unit_price = np.round(unit_cost * rng.uniform(1.1,2.5,len(catalog))[product],2)
+    cost = quantity * unit_cost
+    revenue = quantity * unit_price
+
+    return pd.DataFrame({
+        "Customer_ID": 1000 + customer,
+        "Customer_Name": first + " " + last + " " + (customer // (len(FIRST_NAMES) * len(LAST_NAMES))).astype(str),
+        "Age_Group": pick_strings(rng,["18-25","26-35","36-45","46-60"],size),
+        "Customer_Gender": pick_strings(rng,["Male","Female","Other"],size),
+        "Country": pick_strings(rng,["USA","UK","Germany","Australia","Canada","India"],size),
+        "State": pick_strings(rng,STATES,size),
+        "Month": pick_strings(rng,MONTHS,size),
+        "Order_Date": calendar.strftime("%Y-%m-%d").to_numpy()[offsets],
+        "Product_Category": np.array([item[0] for item in catalog],dtype=object)[product],
+        "Sub_Category": np.array([item[1] for item in catalog],dtype=object)[product],
+        "Product": np.array([item[2] for item in catalog],dtype=object)[product],
+        "Order_Quantity": quantity,
+        "Unit_Cost": unit_cost,
+        "Unit_Price": unit_price,
+        "Cost": cost,
+        "Revenue": revenue,
+        "Profit": revenue - cost,
+    })
+
+
+'''Movie ratings shaped like movie_ratings_dataset.csv (Project 5), with one or two genres per movie'''
+def movies_block(rng,size,start):
+    first_genre = rng.choice(len(GENRES),size=size)
+    second_genre = (first_genre + rng.integers(1,len(GENRES),size)) % len(GENRES)
+    genre_names = np.array(GENRES,dtype=object)
+    genres = np.where(rng.random(size) < 0.5,genre_names[first_genre],genre_names[first_genre] + ", " + genre_names[second_genre])
+
+    return pd.DataFrame({
+        "Title": np.array(TITLES,dtype=object)[rng.integers(0,len(TITLES),size)] + " " + np.arange(start,start + size).astype(str),
+        "Genre": genres,
+        "Year": rng.integers(1970,2025,size),
+        "Rating": np.round(rng.uniform(1,10,size),1),
+        "Votes": rng.integers(100,2_000_000,size),
+        "Runtime": rng.integers(75,200,size),
+        "Country": pick_strings(rng,["USA","UK","France","India","Japan","South Korea"],size),
+        "Language": pick_strings(rng,LANGUAGES,size),
+        "Review": np.array(REVIEWS,dtype=object)[rng.integers(0,len(REVIEWS),size)],
+    })
+
+
+'''Daily weather per station shaped like weather_data.csv (Project 2)'''
+def weather_block(rng,size,start):
+    day = np.arange(start,start + size)
+    dates = pd.Timestamp("2000-01-01") + pd.to_timedelta(day // len(STATIONS),unit="D")
+    season = 10 * np.sin(2 * np.pi * dates.dayofyear.to_numpy() / 365.25)
+    high = np.round(22 + season + rng.normal(0,3,size),1)
+
+    return pd.DataFrame({
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Station": np.array(STATIONS,dtype=object)[day % len(STATIONS)],
+        "Condition": pick_strings(rng,["Sunny","Cloudy","Rain","Storm"],size,dirty=False),
+        "High Temp (°C)": high,
+        "Low Temp (°C)": np.round(high - rng.uniform(4,14,size),1),
+        "Humidity (%)": rng.integers(20,100,size),
+    })
+
+
+'''Long format grade rosters (Project 1): one row per student per subject, classes of 20 to 40 students'''
+def grades_block(rng,size,start):
+    row = np.arange(start,start + size)
+    student = row // len(SUBJECTS)
+    ends = np.cumsum(CLASS_SIZES)
+    cycle,seat = np.divmod(student,ends[-1])         # worked out from the student number, so it doesn't depend on the blocks
+    school_class = cycle * len(CLASS_SIZES) + np.searchsorted(ends,seat,side="right")
+
+    return pd.DataFrame({
+        "Class": "Class " + school_class.astype(str),
+        "Student": np.array(FIRST_NAMES,dtype=object)[student % len(FIRST_NAMES)] + " " + student.astype(str),
+        "Subject": np.array(SUBJECTS,dtype=object)[row % len(SUBJECTS)],
+        "Score": np.clip(np.round(rng.normal(55,18,size)),0,100).astype(int),
+    })
+
+
+
+SCHEMAS = ["sales","orders","movies","weather","grades"]
+
+
+'''Yields the rows of a schema block by block, the same seed always gives the same data'''
+def generate(schema,rows,seed=0):
+    for start in range(0,rows,BLOCK_ROWS):
+        size = min(BLOCK_ROWS,rows - start)
+        rng = np.random.default_rng([seed,start])
+        if schema == "sales":
+            yield sales_block(rng,size)
+        elif schema == "orders":
+            yield orders_block(rng,size,max(rows // 10,1))
+        elif schema == "movies":
+            yield movies_block(rng,size,start)
+        elif schema == "weather":
+            yield weather_block(rng,size,start)
+        elif schema == "grades":
+            yield grades_block(rng,size,start)
+        else:
+            raise ValueError(f"Unknown schema {schema}, choose one of {SCHEMAS}")
+
+
+'''Writes a generated dataset to a csv file'''
+def write_csv(schema,rows,file_name,seed=0):
+    for number,block in enumerate(generate(schema,rows,seed)):
+        block.to_csv(file_name,mode="w" if number == 0 else "a",header=number == 0,index=False)
+    return file_name